@@ -0,0 +1,163 @@
+"""Benchmark harness for the History classes and the WeatherHAT hot paths.
+
+These are not run by a plain ``pytest``, which only collects ``tests/``.
+Run them explicitly, optionally with a simulated I2C transaction time:
+
+    python -m pytest benchmarks --bus-latency 0.0002
+
+Results are saved as JSON to ``--bench-json`` so runs can be compared
+between releases.
+
+"""
+import json
+import os
+import platform
+import sys
+import time
+
+import mock
+import pytest
+
+HARDWARE_MODULES = ("gpiod", "gpiod.line", "gpiodevice", "bme280", "ltr559", "ioexpander", "smbus2")
+
+_results = []
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("weatherhat benchmarks")
+    group.addoption("--bench-json", default="benchmarks/results.json", help="File to save benchmark results to, as JSON")
+    group.addoption("--bench-time", type=float, default=0.25, help="Approximate time to spend measuring each benchmark, in seconds")
+    group.addoption("--bus-latency", type=float, default=0.0, help="Simulated time taken by each I2C transaction, in seconds")
+
+
+def _time_calls(func, number):
+    t_start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - t_start
+
+
+def measure(func, bench_time, rounds=5):
+    """Time ``func``, returning per-call statistics in seconds.
+
+    One warm-up call, and the calls made while calibrating, are left out of
+    the results so one-off costs such as lazily built windows don't skew them.
+
+    """
+    func()
+
+    # Find a number of calls per round that takes long enough to time reliably
+    number = 1
+    elapsed = _time_calls(func, number)
+    while elapsed < bench_time / rounds and number < 10 ** 7:
+        number *= 10 if elapsed < bench_time / rounds / 10 else 2
+        elapsed = _time_calls(func, number)
+
+    times = [_time_calls(func, number) / number for _ in range(rounds)]
+    return {
+        "number": number,
+        "rounds": rounds,
+        "min": min(times),
+        "mean": sum(times) / rounds,
+        "max": max(times)
+    }
+
+
+@pytest.fixture
+def bench(request):
+    """Time a callable and record the result under the current test's name."""
+    def run(func):
+        result = measure(func, request.config.getoption("--bench-time"))
+        callspec = getattr(request.node, "callspec", None)
+        result["name"] = request.node.nodeid
+        result["params"] = dict(callspec.params) if callspec is not None else {}
+        _results.append(result)
+        return result
+    return run
+
+
+def install_hardware_mocks(bus_latency=0.0):
+    """Replace the hardware libraries with mocks and import a fresh weatherhat."""
+    for name in list(sys.modules):
+        if name == "weatherhat" or name.startswith("weatherhat."):
+            del sys.modules[name]
+    mocks = {name: mock.MagicMock() for name in HARDWARE_MODULES}
+    sys.modules.update(mocks)
+
+    def transaction(*args, **kwargs):
+        if bus_latency:
+            time.sleep(bus_latency)
+
+    bus = mocks["smbus2"].SMBus(1)
+    bus.i2c_rdwr.side_effect = transaction
+
+    bme280 = mocks["bme280"].BME280(i2c_dev=bus)
+    bme280.update_sensor.side_effect = transaction
+    bme280.temperature = 20.0
+    bme280.pressure = 1000.0
+    bme280.humidity = 60.0
+
+    ltr559 = mocks["ltr559"].LTR559(i2c_dev=bus)
+    ltr559.get_lux.side_effect = lambda: transaction() or 100.0
+
+    ioe = mocks["ioexpander"].IOE(i2c_addr=0x12)
+    ioe.input.side_effect = lambda pin: transaction() or 0.3
+    ioe.clear_switch_counter.side_effect = transaction
+
+    import weatherhat
+    return weatherhat, mocks
+
+
+def remove_hardware_mocks():
+    for name in list(sys.modules):
+        if name in HARDWARE_MODULES or name == "weatherhat" or name.startswith("weatherhat."):
+            del sys.modules[name]
+
+
+@pytest.fixture(scope="session")
+def history():
+    """The weatherhat.history module, imported with the hardware libraries mocked."""
+    install_hardware_mocks()
+    from weatherhat import history
+    yield history
+    remove_hardware_mocks()
+
+
+@pytest.fixture
+def hardware(request):
+    """A fresh weatherhat module and its hardware mocks, with the simulated bus latency."""
+    weatherhat, mocks = install_hardware_mocks(request.config.getoption("--bus-latency"))
+
+    # Stand in for the gpiod line request with a pipe, so the interrupt thread has something to poll
+    edge_r, edge_w = os.pipe()
+    mocks["gpiodevice"].find_chip_by_platform().request_lines().fd = edge_r
+
+    yield weatherhat, mocks
+
+    os.close(edge_r)
+    os.close(edge_w)
+    remove_hardware_mocks()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    for result in _results:
+        terminalreporter.write_line(f"{result['mean'] * 1e6:12.3f} us  {result['name']}")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    path = session.config.getoption("--bench-json")
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "bus_latency": session.config.getoption("--bus-latency"),
+        "benchmarks": _results
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
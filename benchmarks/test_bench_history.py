@@ -0,0 +1,78 @@
+import random
+import time
+
+import pytest
+
+DEPTHS = (1_000, 10_000, 100_000, 1_000_000)
+
+_filled = {}
+
+
+def filled(history, cls, depth):
+    """A ``cls`` history of ``depth`` samples, one a second up to now, shared between benchmarks."""
+    key = (cls, depth)
+    if key not in _filled:
+        instance = getattr(history, cls)(history_depth=depth)
+        now = time.time()
+        for index in range(depth):
+            instance.append(random.uniform(0, 360), timestamp=now - depth + index)
+        _filled[key] = instance
+    return _filled[key]
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_append(history, bench, depth):
+    samples = filled(history, "History", depth)
+    bench(lambda: samples.append(random.random()))
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_average(history, bench, depth):
+    samples = filled(history, "History", depth)
+    samples.average()
+    bench(samples.average)
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_append_median(history, bench, depth):
+    samples = filled(history, "History", depth)
+    samples.median()
+
+    def append_median():
+        samples.append(random.random())
+        samples.median()
+
+    bench(append_median)
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_gust(history, bench, depth):
+    wind_speed = filled(history, "WindSpeedHistory", depth)
+    # Filling a deep history takes a while, so keep a few samples inside the gust window while measuring
+    now = time.time()
+    for offset in range(10):
+        wind_speed.append(random.uniform(0, 30), timestamp=now + offset)
+    bench(wind_speed.gust)
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_circular_average(history, bench, depth):
+    wind_direction = filled(history, "WindDirectionHistory", depth)
+    wind_direction.circular_average()
+    bench(wind_direction.average_compass)
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_history_compass(history, bench, depth):
+    wind_direction = filled(history, "WindDirectionHistory", depth)
+    bench(lambda: wind_direction.history_compass()[-1])
+
+
+@pytest.mark.parametrize("depth", DEPTHS)
+def test_degrees_to_cardinals(history, bench, depth):
+    degrees = [random.uniform(0, 360) for _ in range(depth)]
+    bench(lambda: history.degrees_to_cardinals(degrees))
+
+
+def test_degrees_to_cardinal(history, bench):
+    bench(lambda: history.degrees_to_cardinal(202.5))
@@ -0,0 +1,39 @@
+import itertools
+
+
+def test_update(hardware, bench):
+    weatherhat, _ = hardware
+    library = weatherhat.WeatherHAT()
+    bench(lambda: library.update(interval=60.0))
+    library.close()
+
+
+def test_update_wind_rain(hardware, bench):
+    weatherhat, _ = hardware
+    library = weatherhat.WeatherHAT()
+    bench(lambda: library.update(interval=0.0))
+    library.close()
+
+
+def test_update_fields(hardware, bench):
+    weatherhat, _ = hardware
+    library = weatherhat.WeatherHAT()
+    bench(lambda: library.update(interval=60.0, fields={"wind_direction"}))
+    library.close()
+
+
+def test_handle_ioe_interrupt(hardware, bench):
+    weatherhat, mocks = hardware
+
+    # Every read finds one more anemometer pulse and rain tick
+    counter = itertools.count()
+
+    def counters():
+        count = next(counter) & 0x7F
+        return iter([count, 0, 0, 0, 0, 0, 0, count])
+
+    mocks["smbus2"].i2c_msg.read().__iter__.side_effect = counters
+
+    library = weatherhat.WeatherHAT()
+    bench(library.handle_ioe_interrupt)
+    library.close()
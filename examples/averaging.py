@@ -21,7 +21,7 @@ dewpoint = history.History()
 lux = history.History()
 
 wind_speed = history.WindSpeedHistory()
-wind_direction = history.WindDirectionHistory()
+wind_direction = history.WindDirectionHistory(windows=(60,))
 
 rain_mm_total = history.History()
 rain_mm_sec = history.History()
@@ -61,7 +61,7 @@ Wind (avg):  Avg: {wind_speed.average():0.2f} mph - Now: {sensor.wind_speed:0.2f
 
 Rain:        Avg: {rain_mm_sec.average():0.2f} mm/sec - Now: {sensor.rain:0.2f} mm/sec - Total: {rain_mm_total.total():0.2f} mm
 
-Wind (avg):  Avg: {wind_direction.average(60):0.2f} degrees ({wind_direction_cardinal}) - Now: {sensor.wind_direction} degrees
+Wind (avg):  Avg: {wind_direction.circular_average(60):0.2f} degrees ({wind_direction_cardinal}) - Now: {sensor.wind_direction} degrees
 
 """)
 
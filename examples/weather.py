@@ -199,7 +199,7 @@ class MainView(SensorView):
             vmax = max(vmax, max([h.value for h in data]))  # auto ranging?
             self.graph(data, x + o_x + 30, y + 20, 180, 64, vmin=vmin, vmax=vmax, bar_width=20, colors=[color])
         else:
-            if isinstance(data, list):
+            if isinstance(data, (list, history.HistoryView)):
                 if len(data) > 0:
                     data = data[-1].value
                 else:
@@ -676,8 +676,8 @@ class SensorData:
 
         self.lux = history.History()
 
-        self.wind_speed = history.WindSpeedHistory()
-        self.wind_direction = history.WindDirectionHistory()
+        self.wind_speed = history.WindSpeedHistory(windows=(60,))
+        self.wind_direction = history.WindDirectionHistory(windows=(self.WIND_DIRECTION_AVERAGE_SAMPLES,))
 
         self.rain_mm_sec = history.History()
         self.rain_total = 0
@@ -709,7 +709,7 @@ class SensorData:
 
         self.rain_mm_sec.append(self.sensor.rain)
 
-        self.needle = math.radians(self.wind_direction.average(self.WIND_DIRECTION_AVERAGE_SAMPLES))
+        self.needle = math.radians(self.wind_direction.circular_average(self.WIND_DIRECTION_AVERAGE_SAMPLES))
         self.needle_trail.append(self.needle)
         self.needle_trail = self.needle_trail[-self.COMPASS_TRAIL_SIZE:]
 
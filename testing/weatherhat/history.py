@@ -1 +0,0 @@
-../../weatherhat/history.py
\ No newline at end of file
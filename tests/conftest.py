@@ -1,3 +1,4 @@
+import os
 import sys
 
 import mock
@@ -12,10 +13,9 @@ def cleanup():
     """
 
     yield None
-    try:
-        del sys.modules["weatherhat"]
-    except KeyError:
-        pass
+    for name in list(sys.modules):
+        if name == "weatherhat" or name.startswith("weatherhat."):
+            del sys.modules[name]
 
 
 @pytest.fixture(scope='function', autouse=False)
@@ -65,4 +65,44 @@ def ltr559():
 def ioe():
     sys.modules['ioexpander'] = mock.MagicMock()
     return sys.modules['ioexpander']
-    del sys.modules["ioexpander"]
\ No newline at end of file
+    del sys.modules["ioexpander"]
+
+
+@pytest.fixture(scope='function', autouse=False)
+def edges(gpiodevice):
+    """Stand in for the gpiod line request with a pipe, yielding its write end.
+
+    Write one byte to it for each interrupt edge.
+    """
+    edge_r, edge_w = os.pipe()
+    request = gpiodevice.find_chip_by_platform().request_lines()
+    request.fd = edge_r
+    request.read_edge_events.side_effect = lambda: [mock.Mock(line_offset=4)] if os.read(edge_r, 1) else []
+    yield edge_w
+    os.close(edge_r)
+    os.close(edge_w)
+
+
+@pytest.fixture(scope='function', autouse=False)
+def closing():
+    """Close everything passed to it once the test is done, even if it failed.
+
+    A WeatherHAT left open keeps its poll thread running into later tests.
+    Request this after ``edges``, so it is torn down first.
+    """
+    objects = []
+
+    def close_later(obj):
+        objects.append(obj)
+        return obj
+
+    yield close_later
+    for obj in reversed(objects):
+        obj.close()
+
+
+@pytest.fixture(scope='function', autouse=False)
+def history(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
+    """Import weatherhat.history with the hardware libraries mocked."""
+    from weatherhat import history
+    return history
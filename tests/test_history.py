@@ -0,0 +1,286 @@
+import math
+import random
+import statistics
+import time
+
+import pytest
+
+
+def test_ring_buffer_wraps(history):
+    h = history.History(history_depth=4)
+
+    for i in range(10):
+        h.append(float(i), timestamp=100.0 + i)
+
+    assert len(h) == 4
+    assert [entry.value for entry in h.history()] == [6.0, 7.0, 8.0, 9.0]
+    assert [entry.value for entry in h.history(2)] == [8.0, 9.0]
+    assert h.latest().value == 9.0
+    assert h.latest().timestamp == 109.0
+    assert h.timespan() == (106.0, 109.0)
+
+    # history_depth can be changed, keeping the most recent samples that fit
+    h = history.WindDirectionHistory(history_depth=4, windows=(3,))
+    for i in range(10):
+        h.append(float(i), timestamp=100.0 + i)
+    h.history_compass()
+    h.history_depth = 2
+    assert [entry.value for entry in h.history()] == [8.0, 9.0]
+    h.append(10.0, timestamp=110.0)
+    assert [entry.value for entry in h.history()] == [9.0, 10.0]
+    h.history_depth = 5
+    for i in range(11, 14):
+        h.append(float(i), timestamp=100.0 + i)
+    assert [entry.value for entry in h.history()] == [9.0, 10.0, 11.0, 12.0, 13.0]
+    assert h.max(3) == 13.0
+    assert h.average() == 11.0
+    assert [entry.timestamp for entry in h.history_compass()] == [109.0, 110.0, 111.0, 112.0, 113.0]
+    with pytest.raises(ValueError):
+        h.history_depth = 0
+
+
+def test_running_aggregates(history):
+    h = history.History(history_depth=50, windows=(10,))
+    values = [random.uniform(-100, 100) for _ in range(500)]
+
+    for i, value in enumerate(values):
+        h.append(value, timestamp=i)
+        full = values[max(0, i - 49):i + 1]
+        recent = values[max(0, i - 9):i + 1]
+        assert h.average() == pytest.approx(sum(full) / len(full))
+        assert h.total() == pytest.approx(sum(full))
+        assert h.min() == min(full)
+        assert h.max() == max(full)
+        assert h.average(10) == pytest.approx(sum(recent) / len(recent))
+        assert h.min(10) == min(recent)
+        assert h.max(10) == max(recent)
+        # Unregistered window sizes fall back to a scan
+        assert h.max(7) == max(values[max(0, i - 6):i + 1])
+
+    # Running sums stay exact once a huge value, or a NaN, has aged out
+    h = history.History(history_depth=4)
+    for value in (1e16, 1.0, 1.0, 1.0, math.nan, 0.5, 0.5, 0.5, 0.5):
+        h.append(value)
+        if value == 1e16:
+            assert h.total() == 1e16
+    assert h.total() == 2.0
+    assert h.average() == 0.5
+
+
+def test_median_and_percentile(history):
+    h = history.History(history_depth=25, windows=(8,))
+    values = [random.choice([random.uniform(0, 10), 5.0]) for _ in range(300)]
+
+    for i, value in enumerate(values):
+        h.append(value, timestamp=i)
+        full = sorted(values[max(0, i - 24):i + 1])
+        recent = sorted(values[max(0, i - 7):i + 1])
+        assert h.median() == pytest.approx(statistics.median(full))
+        assert h.median(8) == pytest.approx(statistics.median(recent))
+        assert h.median(5) == pytest.approx(statistics.median(values[max(0, i - 4):i + 1]))
+        assert h.percentile(0) == full[0]
+        assert h.percentile(100, sample_over=8) == recent[-1]
+
+    h = history.History()
+    for value in (1, 2, 3, 4, 100):
+        h.append(value)
+    assert h.percentile(25) == 2.0
+    assert h.percentile(90) == pytest.approx(61.6)
+
+    # NaN is ignored, and doesn't upset the order once it ages out
+    h = history.History(history_depth=5, windows=(3,))
+    h.append(1.0)
+    h.append(math.nan)
+    assert h.median() == 1.0
+    assert h.median(3) == 1.0
+    for value in (2.0, 3.0, 4.0, 5.0, 6.0):
+        h.append(value)
+    assert h.median() == 4.0
+    assert h.median(3) == 5.0
+    assert h.median(2) == 5.5
+
+    h = history.History()
+    h.append(math.nan)
+    assert math.isnan(h.median())
+
+
+def test_time_windows(history):
+    h = history.WindSpeedHistory(history_depth=100)
+
+    for i in range(250):
+        h.append(float(i % 7), timestamp=1000.0 + i)
+
+    window = h.window(seconds=10, now=1250.0)
+    assert len(window) == 10
+    assert [entry.timestamp for entry in window] == [1240.0 + i for i in range(10)]
+    assert list(window.values()) == [float(i % 7) for i in range(240, 250)]
+    assert len(window[2:5]) == 3
+    assert window[-1].value == h.latest().value
+
+    assert len(h.window(seconds=1000, now=1250.0)) == 100
+    assert len(h.window(seconds=10, now=2000.0)) == 0
+
+    # Views refer to samples, not positions in the buffer
+    h.append(99.0, timestamp=1250.0)
+    assert window[-1].timestamp == 1249.0
+    for i in range(100):
+        h.append(0.0, timestamp=1251.0 + i)
+    with pytest.raises(IndexError):
+        window[0]
+
+
+def test_gust(history):
+    h = history.WindSpeedHistory()
+    now = time.time()
+    for i, value in enumerate((9.0, 1.0, 2.0, 3.0)):
+        h.append(value, timestamp=now - 3 + i)
+
+    assert h.gust(seconds=2.5) == 3.0
+    assert h.gust(seconds=10.0) == 9.0
+    assert h.average(seconds=2.5) == 2.0
+
+
+def test_circular_wind_direction(history):
+    h = history.WindDirectionHistory(history_depth=40, windows=(4,))
+
+    for i in range(100):
+        h.append(350.0 if i % 2 else 10.0, timestamp=i)
+
+    assert 0.0 <= h.circular_average() < 360.0
+    assert h.circular_average() == pytest.approx(0.0, abs=1e-9)
+    assert h.average_compass() == "North"
+    assert h.average_short_compass(4) == "N"
+    assert h.steadiness() == pytest.approx(math.cos(math.radians(10)))
+
+    for i in range(4):
+        h.append(90.0 if i % 2 else 270.0, timestamp=100 + i)
+
+    assert h.steadiness(4) == pytest.approx(0.0, abs=1e-9)
+    assert h.circular_variance(4) == pytest.approx(1.0)
+    # Unregistered sample counts are computed from the samples directly
+    assert h.circular_average(3) == pytest.approx(90.0)
+
+
+def test_tiered_rollups(history):
+    h = history.TieredHistory(history_depth=120, tiers=((60, 60), (3600, 48)))
+
+    # Six hours of 10 second samples, ramping up each hour
+    start = 86400.0
+    for i in range(6 * 360):
+        h.append(float(i % 360), timestamp=start + i * 10)
+    now = start + 6 * 3600
+
+    # Raw samples still cover the last ten minutes
+    assert len(h.rollups(600, now=now)) == 60
+    assert isinstance(h.rollups(600, now=now), history.HistoryView)
+
+    minutes = h.rollups(1800, resolution=60, now=now)
+    assert len(minutes) == 30
+    assert minutes[-1].count == 6
+    assert minutes[-1].min == 354.0
+    assert minutes[-1].max == 359.0
+    assert minutes[-1].mean == 356.5
+
+    # The minute tier only holds an hour, so longer spans use the hour tier
+    hours = h.rollups(5 * 3600, resolution=600, now=now)
+    assert len(hours) == 5
+    assert all(rollup.count == 360 for rollup in hours)
+    assert hours[0].value == pytest.approx(179.5)
+    assert hours[0].timestamp == start + 3600
+
+    # After a gap with no samples, old rollups fall out of the span
+    assert h.rollups(60, resolution=60, now=now + 3 * 3600) == []
+    assert len(h.rollups(4 * 3600, resolution=3600, now=now + 3 * 3600)) == 1
+
+
+def test_numpy_history(history):
+    numpy = pytest.importorskip("numpy")
+
+    h = history.NumpyHistory(history_depth=8)
+    for i in range(5):
+        h.append(float(i), timestamp=100.0 + i)
+
+    # Not yet wrapped, so the values share memory with the ring buffer
+    assert numpy.shares_memory(h.values, h._values)
+    assert list(h.values) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    for i in range(5, 12):
+        h.append(float(i), timestamp=100.0 + i)
+
+    assert list(h.values) == [float(i) for i in range(4, 12)]
+    assert list(h.timestamps) == [100.0 + i for i in range(4, 12)]
+    values, _ = h.arrays(3)
+    assert list(values) == [9.0, 10.0, 11.0]
+    assert h.std() == pytest.approx(numpy.std(numpy.arange(4, 12)))
+    assert list(h.percentiles([0, 50, 100])) == [4.0, 7.5, 11.0]
+    assert h.median() == 7.5
+    assert h.average(2) == 10.5
+
+
+def test_persistent_history(history, tmp_path):
+    path = str(tmp_path / "temperature.hist")
+
+    with history.PersistentHistory(path, history_depth=16) as h:
+        for i in range(20):
+            h.append(float(i), timestamp=100.0 + i)
+
+    with history.PersistentHistory(path, history_depth=16, windows=(4,)) as h:
+        assert len(h) == 16
+        assert h.latest().value == 19.0
+        assert h.timespan() == (104.0, 119.0)
+        assert h.average(4) == 17.5
+        h.append(20.0, timestamp=120.0)
+        assert [entry.value for entry in h.history(3)] == [18.0, 19.0, 20.0]
+
+    with pytest.raises(ValueError):
+        history.PersistentHistory(path, history_depth=32)
+
+    # Power loss after unflushed samples reached storage, but before the header did
+    with history.PersistentHistory(path, history_depth=16, flush_interval=None) as h:
+        for i in range(21, 26):
+            h.append(float(i), timestamp=100.0 + i)
+        crashed = str(tmp_path / "crashed.hist")
+        with open(path, "rb") as f, open(crashed, "wb") as copy:
+            copy.write(f.read())
+
+    with history.PersistentHistory(crashed, history_depth=16) as h:
+        assert h.latest().value == 20.0
+        assert [entry.value for entry in h.history()] == [float(i) for i in range(10, 21)]
+        with pytest.raises(ValueError):
+            h.history_depth = 32
+
+
+def test_cardinal_lookup(history):
+    assert history.degrees_to_cardinal(0) == "North"
+    assert history.degrees_to_cardinal(350) == "North"
+    assert history.degrees_to_cardinal(-90) == "West"
+    assert history.degrees_to_short_cardinal(200) == "S"
+    assert history.degrees_to_short_cardinal(315) == "NW"
+    assert history.degrees_to_cardinals([10, 100, 190, 280]) == ["North", "East", "South", "West"]
+
+    for degrees in range(0, 720, 5):
+        nearest = min(range(0, 360, 45), key=lambda sector: abs((sector - degrees + 180) % 360 - 180))
+        assert history.degrees_to_cardinal(degrees) == history.wind_degrees_to_cardinal[nearest]
+
+    numpy = pytest.importorskip("numpy")
+    assert list(history.degrees_to_cardinals(numpy.array([0.0, 44.0, 359.0]), short=True)) == ["N", "NE", "N"]
+
+
+def test_compass_views(history):
+    h = history.WindDirectionHistory(history_depth=6)
+    for i, degrees in enumerate((0, 90, 180, 270, 45)):
+        h.append(degrees, timestamp=i)
+
+    compass = h.history_compass()
+    assert [entry.value for entry in compass] == ["North", "East", "South", "West", "North East"]
+    assert list(h.history_short_compass(2).values()) == ["W", "NE"]
+    assert compass[-1].timestamp == 4
+    assert [entry.value for entry in compass[1:3]] == ["East", "South"]
+
+    # Repeated renders reuse the same view and the same entries
+    assert h.history_compass() is compass
+    assert h.history_compass()[0] is compass[0]
+
+    for i in range(10):
+        h.append(315, timestamp=5 + i)
+    assert [entry.value for entry in h.history_compass()] == ["North West"] * 6
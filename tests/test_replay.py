@@ -0,0 +1,191 @@
+import os
+import time
+
+import pytest
+
+
+def steady_trace(seconds, start=1000.0):
+    """A steady 4 anemometer pulses/second, with a rain tick every minute."""
+    from weatherhat.replay import TraceEvent
+
+    for second in range(seconds):
+        timestamp = start + second
+        yield TraceEvent(timestamp, "bme280", (20.0 + second / 3600.0, 1000.0, 60.0))
+        yield TraceEvent(timestamp, "vane", (0.3,))
+        yield TraceEvent(timestamp + 0.5, "counters", (4, 1 if second % 60 == 0 else 0))
+
+
+def test_replay_manual_clock(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    from weatherhat.replay import ReplayBackend
+
+    backend = ReplayBackend(steady_trace(3600), speed=None)
+    library = closing(weatherhat.WeatherHAT(backend=backend))
+
+    readings = []
+    while backend.advance(60.0):
+        readings.append(library.update(interval=60.0))
+    readings.append(library.update(interval=60.0))
+
+    # An hour of data, replayed deterministically with no hardware
+    assert len(readings) == 60
+    assert [reading.timestamp for reading in readings] == [1060.0 + 60 * i for i in range(60)]
+    for reading in readings:
+        assert reading.updated_wind_rain
+        assert reading.wind_speed == pytest.approx(library.wind_counts_to_ms(240, 60.0))
+        assert reading.wind_gust == pytest.approx(reading.wind_speed)
+        assert reading.rain_total == pytest.approx(weatherhat.RAIN_MM_PER_TICK)
+        assert reading.wind_direction == 270
+    assert readings[-1].device_temperature == pytest.approx(20.0 + 3599 / 3600.0)
+
+    with pytest.raises(RuntimeError):
+        ReplayBackend([], speed=1.0).advance(1.0)
+
+    library.close()
+    assert backend.finished
+
+
+def test_replay_gust_at_read(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    from weatherhat.replay import ReplayBackend, TraceEvent
+
+    # Every pulse arrives just as the update reads the counters
+    trace = [TraceEvent(1000.0, "vane", (0.3,)), TraceEvent(1060.0, "counters", (30, 0))]
+    backend = ReplayBackend(trace, speed=None)
+    library = closing(weatherhat.WeatherHAT(backend=backend))
+
+    backend.advance(60.0)
+    reading = library.update(interval=60.0)
+
+    assert reading.wind_speed == pytest.approx(library.wind_counts_to_ms(30, 60.0))
+    assert reading.wind_gust >= reading.wind_speed
+    assert reading.wind_gust == pytest.approx(library.wind_counts_to_ms(30, weatherhat.WIND_GUST_SECONDS))
+    assert reading.wind_lull == 0.0
+
+
+def test_replay_speed(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    from weatherhat.replay import ReplayBackend
+
+    # Ten seconds of data at 100x speed
+    backend = ReplayBackend(steady_trace(10), speed=100.0)
+    library = closing(weatherhat.WeatherHAT(backend=backend))
+
+    t_start = time.time()
+    while library._wind_counts < 40 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    assert backend.finished
+    assert library._wind_counts == 40
+    assert library._rain_counts == 1
+    assert library.update(interval=60.0).pressure == 1000.0
+
+    library.close()
+
+    # Pulses that would wrap the 7-bit counters if two events were played between reads
+    from weatherhat.replay import TraceEvent
+    gusty = [TraceEvent(1000.0 + i * 0.1, "counters", (60, 0)) for i in range(100)]
+    for speed in (10.0, 1000.0):
+        backend = ReplayBackend(gusty, speed=speed)
+        library = closing(weatherhat.WeatherHAT(backend=backend))
+
+        t_start = time.time()
+        while library._wind_counts < 6000 and time.time() - t_start < 5.0:
+            time.sleep(0.01)
+
+        assert backend.finished
+        assert library._wind_counts == 6000
+        library.close()
+
+
+def test_replay_high_wind(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    from weatherhat.replay import ReplayBackend, TraceEvent
+
+    # A second of 400Hz pulses, replayed at 10x speed
+    burst = [TraceEvent(1000.05 + i * 0.05, "counters", (20, 0)) for i in range(20)]
+    backend = ReplayBackend(burst, speed=10.0, start=1000.0)
+    library = closing(weatherhat.WeatherHAT(backend=backend))
+
+    t_start = time.time()
+    while library._wind_counts < 400 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+    assert library.get_counter_stats()["high_wind"]
+
+    # Scheduled reads run on the replayed clock, so high wind mode winds down at 10x speed too
+    t_start = time.time()
+    while library.get_counter_stats()["high_wind"] and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    stats = library.get_counter_stats()
+    assert not stats["high_wind"]
+    assert stats["scheduled_reads"] > 0
+    assert library._wind_counts == 400
+
+
+def test_record_and_replay_trace(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, tmp_path):
+    import weatherhat
+    from weatherhat.replay import RecordingBackend, ReplayBackend, TraceReader, TraceWriter
+
+    path = str(tmp_path / "weather.trace")
+
+    def run(backend, replay):
+        library = weatherhat.WeatherHAT(backend=backend)
+        readings = []
+        while replay.advance(60.0):
+            readings.append(library.update(interval=60.0))
+        library.close()
+        return readings
+
+    # Record ten minutes of replayed data, as it would be recorded from the hardware
+    source = ReplayBackend(steady_trace(600), speed=None)
+    recorded = run(RecordingBackend(source, path), source)
+
+    # Fixed-size records: a reading of each sensor per update, and every counter read
+    with TraceReader(path) as trace:
+        assert len(trace) == 3 * len(recorded) + 600
+        assert os.path.getsize(path) == TraceWriter.HEADER_SIZE + len(trace) * TraceWriter.RECORD.size
+        events = list(trace)
+        bme280 = [event for event in events if event.source == "bme280"]
+        assert bme280[0].timestamp == 1060.0
+        assert bme280[0].values == pytest.approx((20.0 + 60 / 3600.0, 1000.0, 60.0))
+        assert sum(event.values[0] for event in events if event.source == "counters") == 4 * 600
+
+    # Recording started before the first counter read was recorded
+    with TraceReader(path) as trace:
+        replay = ReplayBackend(trace, speed=None, start=1000.0)
+        replayed = run(replay, replay)
+
+    assert len(replayed) == len(recorded)
+    for original, copy in zip(recorded, replayed):
+        assert copy.wind_speed == pytest.approx(original.wind_speed)
+        assert copy.rain_total == pytest.approx(original.rain_total)
+        assert copy.temperature == pytest.approx(original.temperature)
+        assert copy.wind_direction == original.wind_direction
+
+    with open(str(tmp_path / "other.trace"), "wb") as f:
+        f.write(b"not a trace file")
+    with pytest.raises(ValueError):
+        TraceReader(str(tmp_path / "other.trace"))
+
+
+def test_append_after_torn_record(tmp_path):
+    from weatherhat.replay import TraceEvent, TraceReader, TraceWriter
+
+    path = str(tmp_path / "weather.trace")
+    with TraceWriter(path) as writer:
+        writer.write(TraceEvent(1000.0, "lux", (100.0,)))
+        writer.write(TraceEvent(1001.0, "lux", (200.0,)))
+
+    # Recording was cut off part way through a record
+    with open(path, "ab") as f:
+        f.write(TraceWriter.RECORD.pack(1002.0, 1, 300.0, 0.0, 0.0)[:7])
+
+    with TraceWriter(path) as writer:
+        writer.write(TraceEvent(1003.0, "vane", (1.2,)))
+
+    with TraceReader(path) as trace:
+        events = list(trace)
+    assert [event.timestamp for event in events] == [1000.0, 1001.0, 1003.0]
+    assert events[2].source == "vane"
+    assert events[2].values == pytest.approx((1.2,))
@@ -1,6 +1,21 @@
-def test_setup(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
+import asyncio
+import itertools
+import os
+import time
+
+import mock
+import pytest
+
+
+def switch_counters(smbus2, *readings):
+    """Queue up (wind, rain) switch counter readings for read_switch_counters()."""
+    blocks = iter([[wind, 0, 0, 0, 0, 0, 0, rain] for wind, rain in readings])
+    smbus2.i2c_msg.read().__iter__.side_effect = lambda: iter(next(blocks))
+
+
+def test_setup(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
     import weatherhat
-    _ = weatherhat.WeatherHAT()
+    library = closing(weatherhat.WeatherHAT())
 
     bus = smbus2.SMBus(1)
 
@@ -8,16 +23,23 @@ def test_setup(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
     ltr559.LTR559.assert_called_once_with(i2c_dev=bus)
     ioe.IOE.assert_called_once_with(i2c_addr=0x12)
 
+    # Closing releases the interrupt line and the buses for the next WeatherHAT
+    library.close()
+    library.close()
+    gpiodevice.find_chip_by_platform().request_lines().release.assert_called_once_with()
+    gpiodevice.find_chip_by_platform().close.assert_called_once_with()
+    bus.close.assert_called_once_with()
+
 
-def test_api(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
+def test_api(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
     import weatherhat
-    library = weatherhat.WeatherHAT()
+    library = closing(weatherhat.WeatherHAT())
 
     bus = smbus2.SMBus(1)
 
-    bme280.BME280(i2c_dev=bus).get_temperature.return_value = 20.0
-    bme280.BME280(i2c_dev=bus).get_pressure.return_value = 10600.0
-    bme280.BME280(i2c_dev=bus).get_humidity.return_value = 60.0
+    bme280.BME280(i2c_dev=bus).temperature = 20.0
+    bme280.BME280(i2c_dev=bus).pressure = 10600.0
+    bme280.BME280(i2c_dev=bus).humidity = 60.0
 
     ltr559.LTR559(i2c_dev=bus).get_lux.return_value = 100.0
 
@@ -25,9 +47,15 @@ def test_api(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
 
     library.temperature_offset = 5.0
 
-    library.update()
+    reading = library.update()
+
+    assert reading is library.latest_reading
+    assert reading.temperature == 25.0
+    with pytest.raises(AttributeError):
+        library.temperature = 0.0
 
     assert library.wind_direction_raw == 2.3
+    bme280.BME280(i2c_dev=bus).update_sensor.assert_called_once_with()
     assert library.wind_direction == 180
     assert library.device_temperature == 20.0
     assert library.temperature == 25.0
@@ -35,3 +63,361 @@ def test_api(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
     assert library.relative_humidity == 15.0
     assert library.humidity == 60.0
     assert library.lux == 100.0
+
+
+def test_vane_voltage_lookup(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2):
+    import weatherhat
+
+    for voltage in (0.0, 0.3, 0.5, 0.9, 1.4, 2.0, 2.3, 2.7, 2.85, 3.3):
+        nearest = min(weatherhat.wind_direction_to_degrees, key=lambda v: abs(v - voltage))
+        assert weatherhat.voltage_to_degrees(voltage) == weatherhat.wind_direction_to_degrees[nearest]
+
+    assert weatherhat.voltages_to_degrees([0.3, 3.0]) == [270, 90]
+
+
+def test_interrupt_thread(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, edges, closing):
+    import weatherhat
+
+    switch_counters(smbus2, (1, 0), (2, 1))
+
+    library = closing(weatherhat.WeatherHAT())
+    os.write(edges, b"\0")
+    os.write(edges, b"\0")
+
+    t_start = time.time()
+    while library._wind_counts < 2 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    assert library._wind_counts == 2
+    assert library._rain_counts == 1
+
+    # The thread only wakes for edges, and stops promptly when closed
+    stats = library.get_poll_stats()
+    assert 1 <= stats["wakeups"] <= 2
+    library.close()
+    assert not library._poll_thread.is_alive()
+
+
+def test_interrupt_coalescing(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, edges, closing):
+    import weatherhat
+
+    switch_counters(smbus2, (5, 2))
+
+    library = closing(weatherhat.WeatherHAT(coalesce=0.2))
+    for _ in range(5):
+        os.write(edges, b"\0")
+
+    t_start = time.time()
+    while library._wind_counts < 5 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    # Five edges inside the window are settled by a single counter read
+    stats = library.get_poll_stats()
+    assert stats["edges"] == 5
+    assert stats["counter_reads"] == 1
+    assert library._wind_counts == 5
+    assert library._rain_counts == 2
+
+    # The window is bounded by the counter overflow horizon
+    library.coalesce = 10.0
+    assert library._coalesce_window() == weatherhat.COALESCE_MAX_WINDOW
+    library._wind_rate = 127 / 0.4
+    assert library._coalesce_window() == pytest.approx(0.1)
+
+
+def test_timing(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, edges, closing):
+    import weatherhat
+
+    request = gpiodevice.find_chip_by_platform().request_lines()
+
+    def read_edge_events():
+        os.read(request.fd, 1)
+        return [mock.Mock(line_offset=4, timestamp_ns=time.monotonic_ns() - 5000000)]
+
+    request.read_edge_events.side_effect = read_edge_events
+    switch_counters(smbus2, (1, 0))
+
+    bus = smbus2.SMBus(1)
+    bme280.BME280(i2c_dev=bus).temperature = 20.0
+    bme280.BME280(i2c_dev=bus).pressure = 1000.0
+    bme280.BME280(i2c_dev=bus).humidity = 60.0
+    ltr559.LTR559(i2c_dev=bus).get_lux.return_value = 100.0
+    ioe.IOE().input.return_value = 0.3
+
+    library = closing(weatherhat.WeatherHAT())
+    library.update()
+    assert library.get_timing_stats() == {}
+
+    library.enable_timing()
+    library.update()
+    library.update()
+    os.write(edges, b"\0")
+
+    t_start = time.time()
+    while library._wind_counts < 1 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    stats = library.get_timing_stats()
+    assert set(stats) == set(weatherhat.TIMING_STAGES)
+    for stage in ("bme280", "ltr559", "vane"):
+        assert stats[stage]["count"] == 2
+        assert sum(stats[stage]["buckets"]) == 2
+    assert stats["lock_wait"]["count"] == stats["lock_hold"]["count"] == 3
+    assert stats["counters"]["count"] == 1
+
+    # The edge was timestamped 5ms before it was read
+    assert stats["interrupt_latency"]["count"] == 1
+    assert stats["interrupt_latency"]["max"] >= 0.005
+    assert sum(stats["interrupt_latency"]["buckets"][13:]) == 1
+
+
+def test_wind_gust(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    library = closing(weatherhat.WeatherHAT())
+
+    switch_counters(smbus2, (3, 0), (1 | 0x80, 0))
+    library.handle_ioe_interrupt()
+    library.handle_ioe_interrupt()  # Counter overflowed from 3 to 1, 126 pulses
+    assert [entry.value for entry in library._wind_pulses.history()] == [3, 126]
+
+    # Clearing the interrupt and reading both counters is one transaction
+    assert library.get_bus_stats()["handle_ioe_interrupt"] == 1
+
+    # A steady 2 pulses/second for a minute, with 30 pulses in one 3 second burst
+    now = 1000.0
+    steady = [now - 60 + i * 0.5 for i in range(120)]
+    burst = [now - 10 + i * 0.1 for i in range(30)]
+    library._wind_pulses = weatherhat.History()
+    for timestamp in sorted(steady + burst):
+        library._wind_pulses.append(1, timestamp=timestamp)
+
+    speeds = library.get_wind_speed_series(resolution=1.0, period=60.0, now=now)
+    assert len(speeds) == 60
+    assert speeds[0] == pytest.approx(library.wind_counts_to_ms(2, 1.0))
+
+    assert library.get_wind_gust(period=60.0, now=now) == pytest.approx(library.wind_counts_to_ms(36, 3.0))
+    assert library.get_wind_lull(period=60.0, now=now) == pytest.approx(library.wind_counts_to_ms(6, 3.0))
+
+    # Once the pulse history is full, time before its oldest pulse isn't counted as calm
+    library._wind_pulses = weatherhat.History(history_depth=20)
+    for i in range(40):
+        library._wind_pulses.append(1, timestamp=now - 20 + i * 0.5)
+    assert len(library.get_wind_speed_series(resolution=1.0, period=60.0, now=now)) == 10
+    assert library.get_wind_lull(period=60.0, now=now) == pytest.approx(library.wind_counts_to_ms(6, 3.0))
+
+
+def test_high_wind(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    library = closing(weatherhat.WeatherHAT())
+
+    clock = [0.0]
+    library._backend.monotonic = lambda: clock[0]
+    library.reset_counts()
+
+    # 40 pulses/second, read every half second, would overflow in about 3 seconds
+    readings = [((20 * i) & 0x7F, 0) for i in range(1, 21)]
+    # Then a 10 second stall, 400 pulses wrap the counter three times
+    switch_counters(smbus2, *readings, ((20 * 20 + 400) & 0x7F, 0))
+    for i in range(1, 21):
+        clock[0] = i * 0.5
+        library.handle_ioe_interrupt()
+
+    stats = library.get_counter_stats()
+    assert stats["wind_pulse_rate"] == pytest.approx(40.0, rel=0.01)
+    assert stats["high_wind"]
+    assert stats["read_period"] == pytest.approx(127 / 40.0 / 4, rel=0.01)
+    assert stats["possible_lost_counts"] == 0
+
+    clock[0] = 20.0
+    library.handle_ioe_interrupt()
+    # Only 16 of the 400 stalled pulses show up in the counter
+    assert library._wind_counts == 400 + 16
+    assert library.get_counter_stats()["possible_lost_counts"] == 384
+
+
+def test_high_wind_scheduled_reads(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, edges, closing):
+    import weatherhat
+
+    # Every read finds another 60 pulses, far more than the counter can hold for long
+    counter = itertools.count(60, 60)
+    smbus2.i2c_msg.read().__iter__.side_effect = lambda: iter([next(counter) & 0x7F, 0, 0, 0, 0, 0, 0, 0])
+
+    library = closing(weatherhat.WeatherHAT())
+    os.write(edges, b"\0")
+
+    # Only one edge arrives, the rest of the reads are scheduled by high wind mode
+    t_start = time.time()
+    while library.get_counter_stats()["scheduled_reads"] < 2 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    stats = library.get_counter_stats()
+    assert stats["high_wind"]
+    assert stats["read_period"] == weatherhat.HIGH_WIND_MIN_PERIOD
+    assert stats["scheduled_reads"] >= 2
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_profiles(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+
+    with pytest.raises(ValueError):
+        weatherhat.WeatherHAT(profile="turbo")
+
+    library = closing(weatherhat.WeatherHAT(profile="low-power"))
+
+    bus = smbus2.SMBus(1)
+    bme280.BME280(i2c_dev=bus).setup.assert_called_once_with(
+        mode="forced",
+        temperature_oversampling=1,
+        pressure_oversampling=1,
+        humidity_oversampling=1,
+        temperature_standby=1000
+    )
+    ltr559.LTR559(i2c_dev=bus).set_light_repeat_rate_ms.assert_called_once_with(2000)
+
+    bme280.BME280(i2c_dev=bus).temperature = 20.0
+    bme280.BME280(i2c_dev=bus).pressure = 1000.0
+    bme280.BME280(i2c_dev=bus).humidity = 60.0
+    ltr559.LTR559(i2c_dev=bus).get_lux.return_value = 100.0
+    ioe.IOE().input.return_value = 0.3
+
+    library.update()
+    assert library.pressure == 1000.0
+    assert library.wind_direction == 270
+
+    # Nothing is due again until the profile's update periods have passed
+    bme280.BME280(i2c_dev=bus).pressure = 1010.0
+    ioe.IOE().input.return_value = 0.9
+    library.update()
+    bme280.BME280(i2c_dev=bus).update_sensor.assert_called_once_with()
+    ltr559.LTR559(i2c_dev=bus).get_lux.assert_called_once_with()
+    assert library.pressure == 1000.0
+    assert library.wind_direction == 270
+    assert library.lux == 100.0
+
+
+def test_update_fields(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    library = closing(weatherhat.WeatherHAT())
+
+    bus = smbus2.SMBus(1)
+    bme280.BME280(i2c_dev=bus).temperature = 20.0
+    bme280.BME280(i2c_dev=bus).pressure = 1000.0
+    bme280.BME280(i2c_dev=bus).humidity = 60.0
+    ltr559.LTR559(i2c_dev=bus).get_lux.return_value = 100.0
+    ioe.IOE().input.return_value = 0.3
+
+    with pytest.raises(ValueError):
+        library.update(fields={"windspeed"})
+
+    library.update(fields={"wind_direction"})
+    bme280.BME280(i2c_dev=bus).update_sensor.assert_not_called()
+    ltr559.LTR559(i2c_dev=bus).get_lux.assert_not_called()
+    assert library.wind_direction == 270
+    assert library.lux == 0.0
+
+    library.compensate_humidity = mock.Mock(wraps=library.compensate_humidity)
+    library.update(fields={"dewpoint", "lux"})
+    library.update(fields={"dewpoint", "lux"})
+    assert bme280.BME280(i2c_dev=bus).update_sensor.call_count == 2
+    assert library.lux == 100.0
+
+    # Relative humidity is only derived again once humidity or temperature change
+    library.compensate_humidity.assert_called_once_with(60.0, 20.0, 12.5)
+    bme280.BME280(i2c_dev=bus).humidity = 70.0
+    library.update(fields={"dewpoint"})
+    assert library.compensate_humidity.call_count == 2
+    assert library.humidity == 70.0
+
+
+def test_sampler(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, closing):
+    import weatherhat
+    library = closing(weatherhat.WeatherHAT())
+
+    bus = smbus2.SMBus(1)
+    bme280.BME280(i2c_dev=bus).temperature = 20.0
+    bme280.BME280(i2c_dev=bus).pressure = 1000.0
+    bme280.BME280(i2c_dev=bus).humidity = 60.0
+    ltr559.LTR559(i2c_dev=bus).get_lux.return_value = 100.0
+    ioe.IOE().input.return_value = 0.3
+
+    assert library.latest_reading.timestamp == 0.0
+
+    # The first read is immediate, the next would be a minute later
+    library.start_sampler(cadence=60.0)
+    t_start = time.time()
+    while library.latest_reading.timestamp == 0.0 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+
+    reading = library.latest_reading
+    assert reading.pressure == 1000.0
+    assert reading.wind_direction == 270
+
+    # update() is served from the sampler rather than the bus
+    bme280.BME280(i2c_dev=bus).update_sensor.reset_mock()
+    library.update()
+    bme280.BME280(i2c_dev=bus).update_sensor.assert_not_called()
+    assert library.temperature == 12.5
+    assert library.lux == 100.0
+    assert library.update(fields={"lux"}) is library.latest_reading
+    with pytest.raises(ValueError):
+        library.update(interval=5.0)
+
+    # A failed read is raised from update() until a read succeeds again
+    library.stop_sampler()
+    bme280.BME280(i2c_dev=bus).update_sensor.side_effect = OSError("I2C bus error")
+    library.start_sampler(cadence=0.01)
+    t_start = time.time()
+    while library._sampler_error is None and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+    with pytest.raises(OSError):
+        library.update()
+    with pytest.raises(OSError):
+        _ = library.latest_reading
+    bme280.BME280(i2c_dev=bus).update_sensor.side_effect = None
+    t_start = time.time()
+    while library._sampler_error is not None and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+    assert library.update().temperature == 12.5
+
+    library.close()
+    assert library._sampler_thread is None
+
+
+def test_async(gpiod, gpiodevice, ioe, bme280, ltr559, smbus2, edges):
+    import weatherhat
+
+    switch_counters(smbus2, (5, 1))
+
+    bus = smbus2.SMBus(1)
+    bme280.BME280(i2c_dev=bus).temperature = 20.0
+    bme280.BME280(i2c_dev=bus).pressure = 1000.0
+    bme280.BME280(i2c_dev=bus).humidity = 60.0
+    ltr559.LTR559(i2c_dev=bus).get_lux.return_value = 100.0
+    ioe.IOE().input.return_value = 0.3
+
+    async def main():
+        async with weatherhat.AsyncWeatherHAT() as library:
+            readings = []
+            async for reading in library.readings(interval=0.01):
+                readings.append(reading)
+                if len(readings) == 1:
+                    os.write(edges, b"\0")
+                if library._wind_counts or len(readings) > 100:
+                    break
+
+            assert library._wind_counts == 5
+            assert library._rain_counts == 1
+            assert readings[0].temperature == 12.5
+            assert library.temperature == 12.5
+
+            # While the sampler runs, update() returns its Reading too
+            library.start_sampler(cadence=60.0)
+            reading = await library.update()
+            library.stop_sampler()
+            assert reading is library.latest_reading
+            return library
+
+    library = asyncio.run(main())
+    assert library._loop is None
+    assert not hasattr(library, "_poll_thread")
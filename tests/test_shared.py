@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def warming_trace(seconds):
+    """One degree warmer every second."""
+    from weatherhat.replay import TraceEvent
+
+    for second in range(seconds):
+        yield TraceEvent(1000.0 + second, "bme280", (20.0 + second, 1000.0, 60.0))
+
+
+def test_publish_readings():
+    import weatherhat
+    from weatherhat.replay import ReplayBackend
+    from weatherhat.shared import SharedReadings
+
+    name = f"weatherhat-test-{os.getpid()}"
+    backend = ReplayBackend(warming_trace(6), speed=None)
+    library = weatherhat.WeatherHAT(backend=backend)
+    library.start_publishing(name, history_depth=4)
+
+    with SharedReadings(name) as readings:
+        assert len(readings) == 0
+        assert readings.latest() is None
+        assert readings.history() == []
+
+        published = []
+        for _ in range(6):
+            published.append(library.update(interval=60.0))
+            backend.advance(1.0)
+
+        assert len(readings) == 6
+        assert readings.latest() == library.latest_reading
+        assert readings.history() == published[-4:]
+        assert readings.history(2) == published[-2:]
+
+    library.close()
+    with pytest.raises(FileNotFoundError):
+        SharedReadings(name)
+
+
+def test_read_without_hardware_libraries():
+    import weatherhat
+    from weatherhat.replay import ReplayBackend
+
+    name = f"weatherhat-test-{os.getpid()}"
+    library = weatherhat.WeatherHAT(backend=ReplayBackend(warming_trace(1), speed=None))
+    library.start_publishing(name)
+    reading = library.update(interval=60.0)
+
+    # A separate process, which never imports the hardware libraries
+    script = (
+        "import sys\n"
+        "from weatherhat.shared import SharedReadings\n"
+        f"print(SharedReadings({name!r}).latest().device_temperature)\n"
+        "assert not {'bme280', 'ltr559', 'ioexpander', 'smbus2', 'gpiod'}.intersection(sys.modules)\n"
+    )
+    env = dict(os.environ, PYTHONPATH=REPO)
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    assert float(result.stdout) == reading.device_temperature
+
+    library.close()
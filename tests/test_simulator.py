@@ -0,0 +1,23 @@
+import time
+
+
+def test_simulated_backend():
+    import weatherhat
+    from weatherhat.simulator import SimulatedBackend
+
+    library = weatherhat.WeatherHAT(backend=SimulatedBackend(wind_speed=10.0, tick=0.01))
+
+    # Simulated pulses raise interrupts, just like the anemometer
+    t_start = time.time()
+    while library._wind_counts == 0 and time.time() - t_start < 5.0:
+        time.sleep(0.01)
+    assert library._wind_counts > 0
+
+    reading = library.update(interval=0.0)
+    assert reading.updated_wind_rain
+    assert reading.wind_speed > 0
+    assert reading.wind_direction in weatherhat.wind_direction_to_degrees.values()
+    assert -10.0 <= reading.device_temperature <= 30.0
+    assert 1000.0 <= reading.pressure <= 1100.0
+
+    library.close()
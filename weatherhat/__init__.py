@@ -1,20 +1,38 @@
+import asyncio
 import math
+import os
 import select
 import threading
 import time
+from bisect import bisect_left
+from collections import namedtuple
 
-import gpiod
-import gpiodevice
-import ioexpander as io
-from bme280 import BME280
-from gpiod.line import Bias, Edge
-from ltr559 import LTR559
-from smbus2 import SMBus
+from .history import History, degrees_to_cardinal, wind_degrees_to_cardinal  # noqa: F401
 
-from .history import wind_degrees_to_cardinal
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __version__ = '1.0.0'
 
+IOE_I2C_ADDR = 0x12
+IOE_REG_INT = 0xF9
+IOE_INT_OUT_EN = 0b10      # Interrupt output enabled, triggered flag cleared
+IOE_REG_SWITCH_P01 = 0x1A  # Switch counters for P0.1 to P1.0 are consecutive
+IOE_SWITCH_ANE2 = 0        # Offset of P0.1 from IOE_REG_SWITCH_P01
+IOE_SWITCH_R4 = 7          # Offset of P1.0 from IOE_REG_SWITCH_P01
+
+# SMBus methods that each make one bus transaction
+BUS_METHODS = (
+    "i2c_rdwr",
+    "read_byte", "write_byte",
+    "read_byte_data", "write_byte_data",
+    "read_word_data", "write_word_data",
+    "read_block_data", "write_block_data",
+    "read_i2c_block_data", "write_i2c_block_data"
+)
+
 # Wind Vane
 PIN_WV = 8     # P0.3 ANE6
 
@@ -33,6 +51,22 @@ PIN_R4 = 2         # P1.0
 PIN_R5 = 1         # P1.5
 RAIN_MM_PER_TICK = 0.2794
 
+# Anemometer pulses are timestamped as they are counted, for gust/lull.
+# Gust and lull only look as far back as these counter reads still reach.
+WIND_PULSE_HISTORY = 8192  # About two minutes of pulse events at 30m/s
+WIND_GUST_SECONDS = 3.0    # WMO gust averaging period
+WIND_GUST_RESOLUTION = 0.25
+
+# The 7-bit switch counters wrap after this many pulses between reads
+COUNTER_OVERFLOW = 128
+# In high wind, read the counters on a schedule as well as on interrupts,
+# once the anemometer could overflow its counter within HIGH_WIND_HORIZON seconds
+HIGH_WIND_HORIZON = 10.0
+HIGH_WIND_READS_PER_HORIZON = 4  # Scheduled reads within each overflow horizon
+HIGH_WIND_MIN_PERIOD = 0.05      # Never schedule reads closer together than this
+WIND_RATE_SMOOTHING = 0.25       # Weight of each new measurement in the pulse rate average
+COALESCE_MAX_WINDOW = 0.5        # Longest time interrupt edges can be coalesced for
+
 wind_direction_to_degrees = {
     0.9: 0,
     2.0: 45,
@@ -44,18 +78,202 @@ wind_direction_to_degrees = {
     0.6: 315
 }
 
+# Vane voltages in ascending order, and the midpoints between them
+_vane_voltages = sorted(wind_direction_to_degrees)
+_vane_degrees = tuple(wind_direction_to_degrees[voltage] for voltage in _vane_voltages)
+_vane_thresholds = tuple((a + b) / 2.0 for a, b in zip(_vane_voltages, _vane_voltages[1:]))
+
+
+def voltage_to_degrees(voltage):
+    """Wind direction in degrees for the wind vane voltage nearest to ``voltage``."""
+    return _vane_degrees[bisect_left(_vane_thresholds, voltage)]
+
+
+def voltages_to_degrees(voltages):
+    """Wind directions for an iterable or ndarray of wind vane voltages.
+
+    NumPy arrays are converted in a single vectorised operation.
+
+    """
+    if numpy is not None and isinstance(voltages, numpy.ndarray):
+        return numpy.array(_vane_degrees)[numpy.searchsorted(_vane_thresholds, voltages)]
+    return [_vane_degrees[bisect_left(_vane_thresholds, voltage)] for voltage in voltages]
+
+
+Profile = namedtuple("Profile", (
+    "bme280_mode",              # "normal" free-runs, "forced" measures only when read
+    "bme280_oversampling",      # Temperature, pressure and humidity oversampling: 1, 2, 4, 8 or 16
+    "bme280_standby",           # Normal mode standby time in ms: 0.5, 10, 20, 62.5, 125, 250, 500 or 1000
+    "ltr559_integration_time",  # Light integration time in ms: 50 to 400 in steps of 50
+    "ltr559_repeat_rate",       # Light measurement rate in ms: 50, 100, 200, 500, 1000 or 2000
+    "bme280_period",            # Minimum time between reads, in seconds, for each sensor
+    "ltr559_period",
+    "vane_period"
+))
+Profile.__doc__ = """Sensor acquisition settings, see PROFILES."""
+
+PROFILES = {
+    # Library defaults, every sensor is read on every update
+    "default": Profile("normal", 16, 500, 50, 50, 0.0, 0.0, 0.0),
+    # Shortest measurement cycle, for fast-changing readings
+    "low-latency": Profile("normal", 1, 0.5, 50, 50, 0.0, 0.0, 0.0),
+    # Heaviest oversampling and longest light integration, read as often as fresh data is ready
+    "low-noise": Profile("normal", 16, 62.5, 400, 500, 0.0, 0.5, 0.0),
+    # Sensors sleep between forced measurements, slow readings are refreshed once a minute
+    "low-power": Profile("forced", 1, 1000, 50, 2000, 60.0, 60.0, 10.0),
+}
+
+Reading = namedtuple("Reading", (
+    "timestamp",
+    "device_temperature",
+    "temperature",
+    "pressure",
+    "humidity",
+    "relative_humidity",
+    "dewpoint",
+    "lux",
+    "wind_speed",
+    "wind_gust",
+    "wind_lull",
+    "wind_direction",
+    "wind_direction_raw",
+    "rain",
+    "rain_total",
+    "updated_wind_rain"
+))
+Reading.__doc__ = """Immutable snapshot of every sensor value from one update."""
+
+# Reading fields that each sensor read refreshes, see update(fields=...)
+SENSOR_FIELDS = {
+    "bme280": ("device_temperature", "temperature", "pressure", "humidity", "relative_humidity", "dewpoint"),
+    "ltr559": ("lux",),
+    "vane": ("wind_direction", "wind_direction_raw"),
+}
+
+# Stages timed by WeatherHAT.enable_timing()
+TIMING_STAGES = ("bme280", "ltr559", "vane", "counters", "lock_wait", "lock_hold", "interrupt_latency")
+TIMING_BUCKETS = 24  # Power of two microsecond buckets, the last collects everything over ~4 seconds
+
+
+class _TimingHistogram:
+    """Count, total, max and a log2 microsecond histogram of durations."""
+    __slots__ = "count", "total", "max", "buckets"
 
-class WeatherHAT:
     def __init__(self):
-        self.updated_wind_rain = False
-        self._interrupt_pin = 4
-        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * TIMING_BUCKETS
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        # Bucket n holds durations from 2 ** (n - 1) up to 2 ** n microseconds
+        self.buckets[min(TIMING_BUCKETS - 1, int(seconds * 1000000).bit_length())] += 1
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": list(self.buckets)
+        }
+
+
+class Backend:
+    """The sensors, counters, interrupt line and clock that WeatherHAT reads.
+
+    HardwareBackend talks to a real Weather HAT. Other backends, such as
+    weatherhat.replay.ReplayBackend, stand in for it without any hardware.
+    WeatherHAT serialises calls to the read methods, but interrupt_fd may
+    be polled and time() called from any thread.
+
+    """
+    # Bus transactions made so far, see WeatherHAT.get_bus_stats()
+    transactions = 0
+    # time.monotonic() of the first edge returned by the last read_interrupts(), if known
+    edge_time = None
+    # Seconds of backend time() that pass per real second, None if the clock only moves when told to
+    clock_rate = 1.0
+
+    def setup(self, profile):
+        """Configure the sensors for an acquisition Profile."""
+
+    def enable_interrupts(self):
+        """Start raising interrupts for switch counter changes."""
+
+    def read_bme280(self):
+        """Measure and return (temperature, pressure, humidity)."""
+        raise NotImplementedError
+
+    def read_lux(self):
+        """Measure and return the light level in lux."""
+        raise NotImplementedError
+
+    def read_vane(self):
+        """Return the wind vane voltage."""
+        raise NotImplementedError
+
+    def read_switch_counters(self):
+        """Clear the interrupt and return the 7-bit (wind, rain) switch counter values."""
+        raise NotImplementedError
+
+    def clear_switch_counters(self):
+        """Reset both switch counters to zero."""
+        raise NotImplementedError
+
+    @property
+    def interrupt_fd(self):
+        """File descriptor that is readable while there are interrupt edges to read."""
+        raise NotImplementedError
+
+    def read_interrupts(self):
+        """Consume the pending interrupt edges and return how many there were."""
+        raise NotImplementedError
+
+    def time(self):
+        """Wall clock time in seconds, used to timestamp readings and pulses."""
+        return time.time()
+
+    def monotonic(self):
+        """Monotonic time in seconds, used to schedule sensor reads."""
+        return time.monotonic()
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class HardwareBackend(Backend):
+    """Backend for the Weather HAT, over I2C and the gpiod interrupt line."""
+    def __init__(self, interrupt_pin=4):
+        # The hardware libraries are imported here, so processes that only read
+        # published readings or replay traces don't need them installed
+        import gpiod
+        import gpiodevice
+        import ioexpander as io
+        from bme280 import BME280
+        from gpiod.line import Bias, Edge
+        from ltr559 import LTR559
+        from smbus2 import SMBus, i2c_msg
+
+        self._i2c_msg = i2c_msg
+        self._interrupt_pin = interrupt_pin
+        self._closed = False
+        self._edge_ns = None
         self._i2c_dev = SMBus(1)
 
         self._bme280 = BME280(i2c_dev=self._i2c_dev)
         self._ltr559 = LTR559(i2c_dev=self._i2c_dev)
 
-        self._ioe = io.IOE(i2c_addr=0x12)
+        self._ioe = io.IOE(i2c_addr=IOE_I2C_ADDR)
+
+        # Count the transactions made on both buses
+        self.transactions = 0
+        for bus in (self._i2c_dev, self._ioe._i2c_dev):
+            for name in BUS_METHODS:
+                setattr(bus, name, self._count_transactions(getattr(bus, name)))
 
         self._chip = gpiodevice.find_chip_by_platform()
 
@@ -89,48 +307,401 @@ class WeatherHAT:
         self._ioe.output(PIN_R3, 0)
         self._ioe.set_pin_interrupt(PIN_R4, True)
 
+    def _count_transactions(self, method):
+        def counted(*args, **kwargs):
+            self.transactions += 1
+            return method(*args, **kwargs)
+        return counted
+
+    def setup(self, profile):
+        self._bme280.setup(
+            mode=profile.bme280_mode,
+            temperature_oversampling=profile.bme280_oversampling,
+            pressure_oversampling=profile.bme280_oversampling,
+            humidity_oversampling=profile.bme280_oversampling,
+            temperature_standby=profile.bme280_standby
+        )
+        self._ltr559.set_light_integration_time_ms(profile.ltr559_integration_time)
+        self._ltr559.set_light_repeat_rate_ms(profile.ltr559_repeat_rate)
+
+    def enable_interrupts(self):
+        self._ioe.enable_interrupt_out()
+        self._ioe.clear_interrupt()
+
+    def read_bme280(self):
+        # Read temperature, pressure and humidity in one burst
+        self._bme280.update_sensor()
+        return self._bme280.temperature, self._bme280.pressure, self._bme280.humidity
+
+    def read_lux(self):
+        return self._ltr559.get_lux()
+
+    def read_vane(self):
+        return self._ioe.input(PIN_WV)
+
+    def read_switch_counters(self):
+        """Clear the IOE interrupt and read both switch counters in one transaction."""
+        i2c_msg = self._i2c_msg
+        msg_clear = i2c_msg.write(IOE_I2C_ADDR, [IOE_REG_INT, IOE_INT_OUT_EN])
+        msg_w = i2c_msg.write(IOE_I2C_ADDR, [IOE_REG_SWITCH_P01])
+        msg_r = i2c_msg.read(IOE_I2C_ADDR, IOE_SWITCH_R4 + 1)
+        self._i2c_dev.i2c_rdwr(msg_clear, msg_w, msg_r)
+        counters = list(msg_r)
+
+        # The most significant bit of each counter is the current GPIO state
+        return counters[IOE_SWITCH_ANE2] & 0x7F, counters[IOE_SWITCH_R4] & 0x7F
+
+    def clear_switch_counters(self):
+        self._ioe.clear_switch_counter(PIN_ANE2)
+        self._ioe.clear_switch_counter(PIN_R4)
+
+    @property
+    def interrupt_fd(self):
+        return self._int.fd
+
+    @property
+    def edge_time(self):
+        # gpiod timestamps edges with CLOCK_MONOTONIC, the same clock as time.monotonic()
+        return self._edge_ns / 1e9 if self._edge_ns is not None else None
+
+    def read_interrupts(self):
+        events = [event for event in self._int.read_edge_events() if event.line_offset == self._interrupt_pin]
+        self._edge_ns = events[0].timestamp_ns if events else None
+        return len(events)
+
+    def close(self):
+        """Release the interrupt line and close the I2C buses, so another WeatherHAT can claim them."""
+        if self._closed:
+            return
+        self._closed = True
+        self._int.release()
+        self._chip.close()
+        self._ioe._i2c_dev.close()
+        self._i2c_dev.close()
+
+
+class WeatherHAT:
+    # Backend created when none is passed in
+    backend_class = HardwareBackend
+
+    # Defaults that let close() run on an instance whose __init__ didn't finish
+    _backend = None
+    _publisher = None
+    _sampler_thread = None
+    _polling = False
+
+    def __init__(self, profile="default", backend=None, coalesce=0.0):
+        """Set up the Weather HAT sensors.
+
+        :param profile: Name of an acquisition profile from PROFILES, or a Profile
+        :param backend: Backend to read from, a new backend_class by default. It is closed along with the WeatherHAT
+        :param coalesce: Seconds of backend time after an interrupt edge to absorb further edges for, before one counter read settles them all
+
+        """
+        if not isinstance(profile, Profile):
+            try:
+                profile = PROFILES[profile]
+            except KeyError:
+                raise ValueError(f"Unknown profile {profile!r}, expected one of: {', '.join(PROFILES)}")
+        self.profile = profile
+        self.coalesce = coalesce
+
+        self._lock = threading.Lock()
+        self._backend = backend if backend is not None else self.backend_class()
+        self._backend.setup(profile)
+        self._bus_stats = {"update": 0, "handle_ioe_interrupt": 0}
+
+        # Monotonic time at which each sensor is next due to be read
+        self._sensor_due = {"bme280": 0.0, "ltr559": 0.0, "vane": 0.0}
+        # Humidity and temperatures that relative humidity and dewpoint were last derived from
+        self._derived_inputs = None
+
         # Data API... kinda
         self.temperature_offset = -7.5
-        self.device_temperature = 0.0
-        self.temperature = 0.0
+        self._reading = Reading(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, False)
 
-        self.pressure = 0.0
+        # Optional shared memory publisher, see start_publishing()
+        self._publisher = None
 
-        self.humidity = 0.0
-        self.relative_humidity = 0.0
-        self.dewpoint = 0.0
+        # Optional background sampler, see start_sampler()
+        self._sampler_thread = None
+        self._sampler_stop = threading.Event()
+        self._sampler_interval = None
+        self._sampler_error = None  # Exception from the sampler's most recent read, if it failed
 
-        self.lux = 0.0
+        # Timestamped anemometer counter increments, value is the pulse count
+        self._wind_pulses = History(history_depth=WIND_PULSE_HISTORY)
 
-        self.wind_speed = 0.0
-        self.wind_direction = 0.0
+        self.reset_counts()
 
-        self.rain = 0.0
-        self.rain_total = 0.0
+        # Anemometer pulse rate, for scheduling counter reads in high wind
+        self._wind_rate = 0.0
+        self._scheduled_reads = 0
+        self._possible_lost_counts = 0
 
-        self.reset_counts()
+        # Per-stage timing histograms, see enable_timing()
+        self._timing = None
+        self._edge_time = None
+
+        self._poll_wakeups = 0
+        self._edges_received = 0
+        self._counter_reads = 0
+        self._poll_cpu_time = 0.0
+        self._poll_t_start = time.monotonic()
+        self._polling = False
+        self._start_polling()
+
+        self._backend.enable_interrupts()
+
+    def __del__(self):
+        self.close()
 
+    def _start_polling(self):
+        """Start the thread that handles IO expander interrupts."""
+        # Writing to this pipe wakes the interrupt thread so it can stop
+        self._stop_r, self._stop_w = os.pipe()
+        self._polling = True
         self._poll_thread = threading.Thread(target=self._t_poll_ioexpander)
         self._poll_thread.start()
 
-        self._ioe.enable_interrupt_out()
-        self._ioe.clear_interrupt()
+    def close(self):
+        """Stop the sampler and interrupt threads, stop publishing, and close the backend."""
+        self.stop_sampler()
+        self.stop_publishing()
+        if self._polling:
+            self._polling = False
+            os.write(self._stop_w, b"\0")
+            if threading.current_thread() is not self._poll_thread:
+                self._poll_thread.join()
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+        if self._backend is not None:
+            self._backend.close()
 
-    def __del__(self):
-        self._polling = False
-        self._poll_thread.join()
+    @property
+    def latest_reading(self):
+        """The most recent Reading, safe to grab from any thread without locking.
+
+        Raises the sampler's exception if its most recent read failed.
+
+        """
+        error = self._sampler_error
+        if error is not None:
+            raise error
+        return self._reading
+
+    def start_sampler(self, cadence=1.0, interval=60.0):
+        """Read the sensors every ``cadence`` seconds on a background thread.
+
+        Each cycle publishes a new Reading as ``latest_reading``. While the
+        sampler runs, update() no longer touches the bus and instead returns
+        the latest Reading, which includes every field. If a read fails the
+        sampler carries on, but ``latest_reading`` and update() raise its
+        exception until a read succeeds again.
+
+        :param cadence: Time between sensor reads, in seconds
+        :param interval: Minimum time to count wind and rain over, as for update()
+
+        """
+        if self._sampler_thread is not None:
+            raise RuntimeError("Sampler is already running.")
+        self._sampler_stop.clear()
+        self._sampler_interval = interval
+        self._sampler_error = None
+        self._sampler_thread = threading.Thread(target=self._t_sampler, args=(cadence, interval), daemon=True)
+        self._sampler_thread.start()
+
+    def stop_sampler(self):
+        """Stop the background sampler, if it is running."""
+        if self._sampler_thread is None:
+            return
+        self._sampler_stop.set()
+        if threading.current_thread() is not self._sampler_thread:
+            self._sampler_thread.join()
+        self._sampler_thread = None
+        self._sampler_error = None
+
+    def _t_sampler(self, cadence, interval):
+        deadline = time.monotonic()
+        while True:
+            try:
+                self._publish(self._read(interval))
+                self._sampler_error = None
+            except Exception as e:
+                self._sampler_error = e
+            deadline = max(deadline + cadence, time.monotonic())
+            if self._sampler_stop.wait(deadline - time.monotonic()):
+                break
+
+    def _publish(self, reading):
+        """Make ``reading`` the latest Reading, and write it to shared memory if publishing."""
+        # Swapping the reference is atomic, so readers never see a partial Reading
+        self._reading = reading
+        publisher = self._publisher
+        if publisher is not None:
+            publisher.publish(reading)
+        return reading
+
+    def start_publishing(self, name="weatherhat", history_depth=1200):
+        """Write every new Reading to a named shared memory block.
+
+        Other processes can read the latest Reading, and up to
+        ``history_depth`` recent ones, with weatherhat.shared.SharedReadings,
+        without locking and without the hardware libraries.
+
+        :param name: Name of the shared memory block
+        :param history_depth: Number of recent Readings to keep
+
+        """
+        from .shared import ReadingPublisher
+
+        if self._publisher is not None:
+            raise RuntimeError("Already publishing.")
+        self._publisher = ReadingPublisher(name, history_depth)
+
+    def stop_publishing(self):
+        """Stop publishing Readings, and remove the shared memory block."""
+        publisher, self._publisher = self._publisher, None
+        if publisher is not None:
+            publisher.close()
+
+    def get_bus_stats(self):
+        """Get I2C transaction counters.
+
+        Returns a dict with the number of bus transactions made by the most
+        recent update() and handle_ioe_interrupt() calls, and in total.
+
+        """
+        stats = dict(self._bus_stats)
+        stats["total"] = self._backend.transactions
+        return stats
+
+    def get_poll_stats(self):
+        """Get interrupt thread wakeup and CPU time counters.
+
+        Returns a dict with the total wakeups, wakeups per second, interrupt
+        edges received, counter reads made and the CPU time in seconds spent
+        by the interrupt thread since it started.
+
+        """
+        elapsed = time.monotonic() - self._poll_t_start
+        return {
+            "wakeups": self._poll_wakeups,
+            "wakeups_per_second": self._poll_wakeups / elapsed if elapsed > 0 else 0.0,
+            "edges": self._edges_received,
+            "counter_reads": self._counter_reads,
+            "cpu_time": self._poll_cpu_time
+        }
+
+    def get_counter_stats(self):
+        """Get anemometer pulse rate and switch counter overflow stats.
+
+        Returns a dict with the smoothed pulse rate in Hz, whether high wind
+        mode is scheduling extra counter reads and how often, the number of
+        scheduled reads made, and how many pulses may have been lost because
+        more than a whole counter's worth arrived between two reads.
+
+        """
+        period = self._counter_read_period()
+        return {
+            "wind_pulse_rate": self._wind_rate,
+            "high_wind": period is not None,
+            "read_period": period,
+            "scheduled_reads": self._scheduled_reads,
+            "possible_lost_counts": self._possible_lost_counts
+        }
+
+    def _counter_read_period(self):
+        """Seconds between scheduled counter reads in high wind, or None."""
+        if self._wind_rate <= 0:
+            return None
+        horizon = (COUNTER_OVERFLOW - 1) / self._wind_rate
+        if horizon >= HIGH_WIND_HORIZON:
+            return None
+        return max(HIGH_WIND_MIN_PERIOD, horizon / HIGH_WIND_READS_PER_HORIZON)
+
+    def enable_timing(self, enabled=True):
+        """Start, or stop, timing each stage of update() and handle_ioe_interrupt().
+
+        Timing is off by default and costs next to nothing while it is.
+        Enabling it starts fresh histograms, see get_timing_stats().
+
+        """
+        self._timing = {stage: _TimingHistogram() for stage in TIMING_STAGES} if enabled else None
+        self._edge_time = None
+
+    def get_timing_stats(self):
+        """Get a snapshot of the per-stage timing histograms.
+
+        Returns a dict keyed by stage: each sensor read, the counter read, waiting
+        for and holding the lock, and interrupt latency from edge to counter read.
+        Each has the count, total, mean and max duration in seconds, and counts in
+        power of two buckets where bucket n is up to 2 ** n microseconds.
+        Returns an empty dict if timing is not enabled.
+
+        """
+        timing = self._timing
+        if timing is None:
+            return {}
+        return {stage: histogram.snapshot() for stage, histogram in timing.items()}
+
+    def _timed(self, stage, func):
+        timing = self._timing
+        if timing is None:
+            return func()
+        t_start = time.perf_counter()
+        result = func()
+        timing[stage].record(time.perf_counter() - t_start)
+        return result
+
+    def _acquire_lock(self):
+        """Take the lock, returning the time it was taken if timing is enabled."""
+        timing = self._timing
+        if timing is None:
+            self._lock.acquire(blocking=True)
+            return None
+        t_wait = time.perf_counter()
+        self._lock.acquire(blocking=True)
+        t_locked = time.perf_counter()
+        timing["lock_wait"].record(t_locked - t_wait)
+        return t_locked
+
+    def _release_lock(self, t_locked):
+        timing = self._timing
+        if timing is not None and t_locked is not None:
+            timing["lock_hold"].record(time.perf_counter() - t_locked)
+        self._lock.release()
+
+    def _real_seconds(self, seconds):
+        """Convert ``seconds`` of backend time to real seconds, for timeouts.
+
+        Returns None if ``seconds`` is None, or the backend clock doesn't run by itself.
+
+        """
+        rate = self._backend.clock_rate
+        if seconds is None or rate is None:
+            return None
+        return seconds / rate
+
+    def _coalesce_window(self):
+        """Real seconds to coalesce interrupt edges for, bounded well inside the counter overflow horizon."""
+        window = min(self.coalesce, COALESCE_MAX_WINDOW)
+        period = self._counter_read_period()
+        if period is not None:
+            window = min(window, period)
+        return self._real_seconds(window) or 0.0
 
     def reset_counts(self):
         self._lock.acquire(blocking=True)
-        self._ioe.clear_switch_counter(PIN_ANE2)
-        self._ioe.clear_switch_counter(PIN_R4)
+        self._backend.clear_switch_counters()
         self._lock.release()
 
         self._wind_counts = 0
         self._rain_counts = 0
         self._last_wind_counts = 0
         self._last_rain_counts = 0
-        self._t_start = time.time()
+        self._t_start = self._backend.time()
+        self._t_counters = self._backend.monotonic()
 
     def compensate_humidity(self, humidity, temperature, corrected_temperature):
         """Compensate humidity.
@@ -151,95 +722,394 @@ class WeatherHAT:
         return hpa * 0.02953
 
     def degrees_to_cardinal(self, degrees):
-        value, cardinal = min(wind_degrees_to_cardinal.items(), key=lambda item: abs(item[0] - degrees))
-        return cardinal
+        return degrees_to_cardinal(degrees)
+
+    def wind_counts_to_ms(self, counts, seconds):
+        """Convert anemometer pulses counted over ``seconds`` to meters/second."""
+        # wind speed of 2.4km/h causes the switch to close once per second
+        wind_hz = counts / seconds / 2.0  # Two pulses per rotation
+        wind_cms = wind_hz * ANE_CIRCUMFERENCE * ANE_FACTOR
+        return wind_cms / 100.0
+
+    def _wind_pulse_bins(self, resolution, period, now):
+        """Count anemometer pulses into ``resolution`` second bins covering ``period``."""
+        if now is None:
+            now = self._backend.time()
+
+        self._lock.acquire(blocking=True)
+        pulses = self._wind_pulses
+        if len(pulses) == pulses.history_depth:
+            # Older pulses have aged out, so don't count that time as calm
+            period = max(resolution, min(period, now - pulses.timespan()[0]))
+        bins = max(1, round(period / resolution))
+        start = now - bins * resolution
+        counts = [0] * bins
+        window = self._wind_pulses.window(bins * resolution, now)
+        for count, timestamp in zip(window.values(), window.timestamps()):
+            # Pulses read at or after ``now``, such as by the read that ends an update, go in the last bin
+            index = min(int((timestamp - start) / resolution), bins - 1)
+            if index >= 0:
+                counts[index] += count
+        self._lock.release()
+
+        return counts
+
+    def get_wind_speed_series(self, resolution=WIND_GUST_RESOLUTION, period=60.0, now=None):
+        """Wind speed in meters/second for each ``resolution`` second slice of the last ``period`` seconds."""
+        return [self.wind_counts_to_ms(count, resolution) for count in self._wind_pulse_bins(resolution, period, now)]
+
+    def _wind_rolling_counts(self, seconds, resolution, period, now):
+        counts = self._wind_pulse_bins(resolution, period, now)
+        size = min(len(counts), max(1, round(seconds / resolution)))
+        total = sum(counts[:size])
+        totals = [total]
+        for index in range(size, len(counts)):
+            total += counts[index] - counts[index - size]
+            totals.append(total)
+        return totals, size * resolution
+
+    def get_wind_gust(self, seconds=WIND_GUST_SECONDS, period=60.0, resolution=WIND_GUST_RESOLUTION, now=None):
+        """Peak ``seconds`` average wind speed in meters/second over the last ``period`` seconds.
+
+        ``period`` is cut short to the time covered by the last WIND_PULSE_HISTORY counter reads.
+
+        """
+        totals, seconds = self._wind_rolling_counts(seconds, resolution, period, now)
+        return self.wind_counts_to_ms(max(totals), seconds)
+
+    def get_wind_lull(self, seconds=WIND_GUST_SECONDS, period=60.0, resolution=WIND_GUST_RESOLUTION, now=None):
+        """Lowest ``seconds`` average wind speed in meters/second over the last ``period`` seconds.
+
+        ``period`` is cut short to the time covered by the last WIND_PULSE_HISTORY counter reads.
+
+        """
+        totals, seconds = self._wind_rolling_counts(seconds, resolution, period, now)
+        return self.wind_counts_to_ms(min(totals), seconds)
+
+    def _wind_gust_lull(self, period, now):
+        """Gust and lull from a single pass over the pulse history, as for get_wind_gust() and get_wind_lull()."""
+        totals, seconds = self._wind_rolling_counts(WIND_GUST_SECONDS, WIND_GUST_RESOLUTION, period, now)
+        return self.wind_counts_to_ms(max(totals), seconds), self.wind_counts_to_ms(min(totals), seconds)
 
     def _t_poll_ioexpander(self):
-        self._polling = True
+        t_cpu_start = time.thread_time()
         poll = select.poll()
-        poll.register(self._int.fd, select.POLLIN)
+        poll.register(self._stop_r, select.POLLIN)
+        poll.register(self._backend.interrupt_fd, select.POLLIN)
+        deadline = None
         while self._polling:
-            if not poll.poll(10):
-                continue
-            for event in self._int.read_edge_events():
-                if event.line_offset == self._interrupt_pin:
+            # Block until there is an edge event, or close() wakes us. Time out to
+            # settle coalesced edges, or in high wind to read the counters before they can overflow
+            timeout = self._real_seconds(self._counter_read_period())
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            events = poll.poll(None if timeout is None else math.ceil(timeout * 1000))
+            self._poll_wakeups += 1
+
+            edges = 0
+            for fd, _ in events:
+                if fd == self._backend.interrupt_fd:
+                    edges += self._backend.read_interrupts()
+            self._edges_received += edges
+            if edges and self._timing is not None and self._edge_time is None:
+                self._edge_time = self._backend.edge_time
+
+            window = self._coalesce_window()
+            if edges and deadline is None and window > 0:
+                deadline = time.monotonic() + window
+            if deadline is not None:
+                # Absorb edges until the deadline, then one read settles them all
+                if time.monotonic() >= deadline:
+                    deadline = None
+                    self.handle_ioe_interrupt()
+            elif edges:
+                for _ in range(edges):
                     self.handle_ioe_interrupt()
-            time.sleep(1.0 / 100)
+            elif not events:
+                self._scheduled_reads += 1
+                self.handle_ioe_interrupt()
+            self._poll_cpu_time = time.thread_time() - t_cpu_start
 
-    def update(self, interval=60.0):
+    def update(self, interval=60.0, fields=None):
+        """Read the sensors and return a new Reading.
 
-        # Time elapsed since last update
-        delta = float(time.time() - self._t_start)
+        The Reading also becomes ``latest_reading``, which the data attributes
+        such as ``temperature`` are read from. While the sampler runs, this
+        returns its latest Reading instead, see start_sampler().
 
-        self.updated_wind_rain = False
+        :param interval: Minimum time to count wind and rain over, in seconds
+        :param fields: Optional set of Reading field names, only the sensors needed for these are read
 
-        # Always update TPHL & Wind Direction
-        self._lock.acquire(blocking=True)
+        """
+        sensors = self._sensors_for(fields)
+        if self._sampler_thread is not None:
+            return self._sampled_reading(interval)
 
-        self.device_temperature = self._bme280.get_temperature()
-        self.temperature = self.device_temperature + self.temperature_offset
+        return self._publish(self._read(interval, sensors))
 
-        self.pressure = self._bme280.get_pressure()
-        self.humidity = self._bme280.get_humidity()
+    def _sampled_reading(self, interval):
+        """The sampler's latest Reading, for update() while the sampler is running."""
+        if interval != self._sampler_interval:
+            raise ValueError(f"The sampler counts wind and rain over {self._sampler_interval}s, not {interval}s")
+        return self.latest_reading
 
-        self.relative_humidity = self.compensate_humidity(self.humidity, self.device_temperature, self.temperature)
+    def _sensors_for(self, fields):
+        """The set of sensors that must be read to refresh ``fields``."""
+        if fields is None:
+            return set(SENSOR_FIELDS)
+        unknown = set(fields).difference(Reading._fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return {sensor for sensor, provides in SENSOR_FIELDS.items() if not set(provides).isdisjoint(fields)}
 
-        self.dewpoint = self.get_dewpoint(self.humidity, self.device_temperature)
+    def _due(self, sensor, period, t_now):
+        """True if ``sensor`` should be read now, scheduling its next read if so."""
+        if t_now < self._sensor_due[sensor]:
+            return False
+        self._sensor_due[sensor] = t_now + period
+        return True
 
-        self.lux = self._ltr559.get_lux()
+    def _read(self, interval, sensors=SENSOR_FIELDS):
+        """Read every sensor in ``sensors`` that is due and return a new Reading.
 
-        self.wind_direction_raw = self._ioe.input(PIN_WV)
+        Sensors that were not asked for, or that the profile says have no
+        fresh data yet, are skipped and their values carried over from the
+        previous Reading.
 
-        self._lock.release()
+        """
+
+        # Time elapsed since last update
+        now = self._backend.time()
+        delta = float(now - self._t_start)
+        t_now = self._backend.monotonic()
+        previous = self._reading
+
+        device_temperature, temperature, pressure, humidity, relative_humidity, dewpoint, lux = previous[1:8]
+        wind_direction = previous.wind_direction
+        wind_direction_raw = previous.wind_direction_raw
 
-        value, self.wind_direction = min(wind_direction_to_degrees.items(), key=lambda item: abs(item[0] - self.wind_direction_raw))
+        t_locked = self._acquire_lock()
+        try:
+            transactions = self._backend.transactions
+
+            if "bme280" in sensors and self._due("bme280", self.profile.bme280_period, t_now):
+                device_temperature, pressure, humidity = self._timed("bme280", self._backend.read_bme280)
+                temperature = device_temperature + self.temperature_offset
+
+                # Derived values only need recomputing when their inputs change
+                derived_inputs = (humidity, device_temperature, temperature)
+                if derived_inputs != self._derived_inputs:
+                    self._derived_inputs = derived_inputs
+                    relative_humidity = self.compensate_humidity(humidity, device_temperature, temperature)
+                    dewpoint = self.get_dewpoint(humidity, device_temperature)
+
+            if "ltr559" in sensors and self._due("ltr559", self.profile.ltr559_period, t_now):
+                lux = self._timed("ltr559", self._backend.read_lux)
+
+            if "vane" in sensors and self._due("vane", self.profile.vane_period, t_now):
+                wind_direction_raw = self._timed("vane", self._backend.read_vane)
+                wind_direction = voltage_to_degrees(wind_direction_raw)
+
+            self._bus_stats["update"] = self._backend.transactions - transactions
+        finally:
+            self._release_lock(t_locked)
 
         # Don't update rain/wind data until we've sampled for long enough
         if delta < interval:
-            return
-
-        self.updated_wind_rain = True
+            return Reading(
+                now, device_temperature, temperature, pressure, humidity, relative_humidity, dewpoint, lux,
+                previous.wind_speed, previous.wind_gust, previous.wind_lull, wind_direction, wind_direction_raw,
+                previous.rain, previous.rain_total, False
+            )
 
         rain_hz = self._rain_counts / delta
-        wind_hz = self._wind_counts / delta
-        self.rain_total = self._rain_counts * RAIN_MM_PER_TICK
+        rain_total = self._rain_counts * RAIN_MM_PER_TICK
+        wind_speed = self.wind_counts_to_ms(self._wind_counts, delta)
+        wind_gust, wind_lull = self._wind_gust_lull(delta, now)
         self.reset_counts()
 
-        # wind speed of 2.4km/h causes the switch to close once per second
+        rain = rain_hz * RAIN_MM_PER_TICK
 
-        wind_hz /= 2.0  # Two pulses per rotation
-        wind_cms = wind_hz * ANE_CIRCUMFERENCE * ANE_FACTOR
-        self.wind_speed = wind_cms / 100.0
+        return Reading(
+            now, device_temperature, temperature, pressure, humidity, relative_humidity, dewpoint, lux,
+            wind_speed, wind_gust, wind_lull, wind_direction, wind_direction_raw,
+            rain, rain_total, True
+        )
+
+    def read_switch_counters(self):
+        """Clear the IOE interrupt and read both switch counters in one transaction.
 
-        self.rain = rain_hz * RAIN_MM_PER_TICK
+        Returns the 7-bit wind and rain counter values.
+
+        """
+        return self._backend.read_switch_counters()
 
     def handle_ioe_interrupt(self):
-        self._lock.acquire(blocking=True)
-        self._ioe.clear_interrupt()
+        t_locked = self._acquire_lock()
+        try:
+            transactions = self._backend.transactions
 
-        wind_counts, _ = self._ioe.read_switch_counter(PIN_ANE2)
-        rain_counts, _ = self._ioe.read_switch_counter(PIN_R4)
+            wind_counts, rain_counts = self._timed("counters", self.read_switch_counters)
+            self._counter_reads += 1
+            if self._edge_time is not None:
+                if self._timing is not None:
+                    self._timing["interrupt_latency"].record(time.monotonic() - self._edge_time)
+                self._edge_time = None
+            t_read = self._backend.monotonic()
+            elapsed = t_read - self._t_counters
+            self._t_counters = t_read
 
-        # If the counter value is *less* than the previous value
-        # then we know the 7-bit switch counter overflowed
-        # We bump the count value by the lost counts between last_wind and 128
-        # since at 127 counts, one more count will overflow us back to 0
-        if wind_counts < self._last_wind_counts:
-            self._wind_counts += 128 - self._last_wind_counts
-            self._wind_counts += wind_counts
-        else:
-            self._wind_counts += wind_counts - self._last_wind_counts
+            # If the counter value is *less* than the previous value
+            # then we know the 7-bit switch counter overflowed
+            # We bump the count value by the lost counts between last_wind and 128
+            # since at 127 counts, one more count will overflow us back to 0
+            if wind_counts < self._last_wind_counts:
+                wind_delta = 128 - self._last_wind_counts + wind_counts
+            else:
+                wind_delta = wind_counts - self._last_wind_counts
 
-        self._last_wind_counts = wind_counts
+            if elapsed > 0:
+                # A delta can't show whole counter wraps, so count any the pulse rate says we missed
+                expected = self._wind_rate * elapsed
+                self._possible_lost_counts += round(max(0.0, expected - wind_delta) / COUNTER_OVERFLOW) * COUNTER_OVERFLOW
+                self._wind_rate += (wind_delta / elapsed - self._wind_rate) * WIND_RATE_SMOOTHING
 
-        if rain_counts < self._last_rain_counts:
-            self._rain_counts += 128 - self._last_rain_counts
-            self._rain_counts += rain_counts
-        else:
-            self._rain_counts += rain_counts - self._last_rain_counts
+            if wind_delta:
+                self._wind_counts += wind_delta
+                self._wind_pulses.append(wind_delta, timestamp=self._backend.time())
 
-        self._last_rain_counts = rain_counts
+            self._last_wind_counts = wind_counts
 
-        # print(wind_counts, rain_counts, self._wind_counts, self._rain_counts)
+            if rain_counts < self._last_rain_counts:
+                self._rain_counts += 128 - self._last_rain_counts
+                self._rain_counts += rain_counts
+            else:
+                self._rain_counts += rain_counts - self._last_rain_counts
 
-        self._lock.release()
+            self._last_rain_counts = rain_counts
+
+            # print(wind_counts, rain_counts, self._wind_counts, self._rain_counts)
+
+            self._bus_stats["handle_ioe_interrupt"] = self._backend.transactions - transactions
+        finally:
+            self._release_lock(t_locked)
+
+
+def _reading_property(field):
+    index = Reading._fields.index(field)
+    return property(lambda self: self._reading[index], doc=f"``{field}`` from latest_reading.")
+
+
+# The data attributes are read-only views of latest_reading
+for _field in Reading._fields[1:]:
+    setattr(WeatherHAT, _field, _reading_property(_field))
+
+
+class AsyncWeatherHAT(WeatherHAT):
+    """WeatherHAT for asyncio applications.
+
+    Rather than running its own interrupt thread, the gpiod interrupt line is
+    watched by the event loop with ``loop.add_reader``, and blocking I2C
+    reads are run in the loop's default executor. Use as an async context
+    manager, or call start() from within a running loop and close() when done.
+
+        async with AsyncWeatherHAT() as hat:
+            async for reading in hat.readings(interval=5.0):
+                print(reading.temperature)
+
+    """
+    _loop = None
+    _read_timer = None
+    _coalesce_timer = None
+
+    def _start_polling(self):
+        """The event loop watches for interrupts instead, see start()."""
+
+    def start(self):
+        """Start watching for interrupts on the running event loop."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._backend.interrupt_fd, self._handle_edge_events)
+
+    def close(self):
+        self.stop_sampler()
+        self.stop_publishing()
+        for timer in (self._read_timer, self._coalesce_timer):
+            if timer is not None:
+                timer.cancel()
+        self._read_timer = self._coalesce_timer = None
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._backend.interrupt_fd)
+        self._loop = None
+        if self._backend is not None:
+            self._backend.close()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _handle_edge_events(self):
+        self._poll_wakeups += 1
+        edges = self._backend.read_interrupts()
+        self._edges_received += edges
+        if edges and self._timing is not None and self._edge_time is None:
+            self._edge_time = self._backend.edge_time
+        window = self._coalesce_window()
+        if window > 0:
+            # Absorb edges until the deadline, then one read settles them all
+            if edges and self._coalesce_timer is None:
+                self._coalesce_timer = self._loop.call_later(window, self._settle_edges)
+            return
+        for _ in range(edges):
+            self._read_counters()
+
+    def _settle_edges(self):
+        self._coalesce_timer = None
+        self._read_counters()
+
+    def _read_counters(self):
+        future = self._loop.run_in_executor(None, self.handle_ioe_interrupt)
+        future.add_done_callback(lambda _: self._schedule_counter_read())
+
+    def _schedule_counter_read(self):
+        """In high wind, read the counters again after a while unless an edge comes first."""
+        if self._read_timer is not None:
+            self._read_timer.cancel()
+            self._read_timer = None
+        period = self._real_seconds(self._counter_read_period())
+        if period is not None and self._loop is not None:
+            self._read_timer = self._loop.call_later(period, self._scheduled_counter_read)
+
+    def _scheduled_counter_read(self):
+        self._read_timer = None
+        self._scheduled_reads += 1
+        self._read_counters()
+
+    async def update(self, interval=60.0, fields=None):
+        """Read the sensors without blocking the event loop, returning a Reading.
+
+        While the sampler runs, this returns its latest Reading instead, as WeatherHAT.update() does.
+
+        """
+        sensors = self._sensors_for(fields)
+        if self._sampler_thread is not None:
+            return self._sampled_reading(interval)
+        return self._publish(await asyncio.get_running_loop().run_in_executor(None, self._read, interval, sensors))
+
+    async def readings(self, interval=5.0, wind_rain_interval=60.0):
+        """Yield a new Reading every ``interval`` seconds.
+
+        :param interval: Time between readings, in seconds
+        :param wind_rain_interval: Minimum time to count wind and rain over, as for WeatherHAT.update()
+
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            yield await self.update(wind_rain_interval)
+            deadline = max(deadline + interval, loop.time())
+            await asyncio.sleep(deadline - loop.time())
@@ -1,4 +1,17 @@
+import math
+import mmap
+import os
+import random
+import struct
 import time
+from array import array
+from collections import deque
+from collections.abc import Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 wind_degrees_to_cardinal = {
     0: "North",
@@ -22,6 +35,43 @@ wind_degrees_to_short_cardinal = {
     315: "NW"
 }
 
+# Cardinal names in sector order, each sector spanning 45 degrees
+_cardinals = tuple(name for _, name in sorted(wind_degrees_to_cardinal.items()))
+_short_cardinals = tuple(name for _, name in sorted(wind_degrees_to_short_cardinal.items()))
+
+
+def cardinal_index(degrees):
+    """Index of the compass sector nearest to ``degrees``, from 0 (North) to 7."""
+    return int((degrees % 360 + 22.5) // 45) % 8
+
+
+def degrees_to_cardinal(degrees):
+    return _cardinals[cardinal_index(degrees)]
+
+
+def degrees_to_short_cardinal(degrees):
+    return _short_cardinals[cardinal_index(degrees)]
+
+
+def cardinal_indices(degrees):
+    """Compass sector indices for an iterable or ndarray of angles.
+
+    NumPy arrays are converted in a single vectorised operation.
+
+    """
+    if numpy is not None and isinstance(degrees, numpy.ndarray):
+        return ((degrees % 360 + 22.5) // 45).astype(int) % 8
+    return [int((value % 360 + 22.5) // 45) % 8 for value in degrees]
+
+
+def degrees_to_cardinals(degrees, short=False):
+    """Cardinal names for an iterable or ndarray of angles."""
+    names = _short_cardinals if short else _cardinals
+    indices = cardinal_indices(degrees)
+    if numpy is not None and isinstance(indices, numpy.ndarray):
+        return numpy.array(names)[indices]
+    return [names[index] for index in indices]
+
 
 class HistoryEntry:
     __slots__ = 'value', 'timestamp'
@@ -31,48 +81,867 @@ class HistoryEntry:
         self.value = value
 
 
+class _SkiplistNode:
+    __slots__ = 'value', 'next', 'width'
+
+    def __init__(self, value, levels):
+        self.value = value
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+_SKIPLIST_END = _SkiplistNode(math.inf, 0)
+
+
+class _IndexableSkiplist:
+    """Sorted multiset with O(log n) insert, remove and lookup by rank.
+
+    Each link records how many bottom level nodes it skips, so the ``n``th
+    smallest value can be found by walking down the levels.
+
+    """
+    def __init__(self, expected_size=100):
+        self.size = 0
+        self.levels = int(1 + math.log2(max(expected_size, 1)))
+        self.head = _SkiplistNode(None, self.levels)
+        self.head.next = [_SKIPLIST_END] * self.levels
+
+    @classmethod
+    def from_sorted(cls, values, expected_size=100):
+        """Build a skiplist from values already in sorted order, in O(n)."""
+        skiplist = cls(expected_size)
+        last = [skiplist.head] * skiplist.levels  # Last node linked at each level
+        last_rank = [0] * skiplist.levels
+        rank = 0
+        for value in values:
+            rank += 1
+            node = _SkiplistNode(value, skiplist._random_levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = rank - last_rank[level]
+                last[level] = node
+                last_rank[level] = rank
+        for level in range(skiplist.levels):
+            last[level].next[level] = _SKIPLIST_END
+            last[level].width[level] = rank + 1 - last_rank[level]
+        skiplist.size = rank
+        return skiplist
+
+    def _random_levels(self):
+        return min(self.levels, 1 - int(math.log2(1.0 - random.random())))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, rank):
+        if not 0 <= rank < self.size:
+            raise IndexError("rank out of range")
+        node = self.head
+        rank += 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= rank:
+                rank -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def insert(self, value):
+        chain = [None] * self.levels
+        steps_at_level = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_levels()
+        new_node = _SkiplistNode(value, levels)
+        steps = 0
+        for level in range(levels):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            new_node.width[level] = prev_node.width[level] - steps
+            prev_node.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        if chain[0].next[0].value != value:
+            raise KeyError(value)
+
+        levels = len(chain[0].next[0].next)
+        for level in range(levels):
+            prev_node = chain[level]
+            prev_node.width[level] += prev_node.next[level].width[level] - 1
+            prev_node.next[level] = prev_node.next[level].next[level]
+        for level in range(levels, self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+def _percentile(ordered, count, percent):
+    """Linearly interpolated percentile of ``count`` sorted values."""
+    if count == 0:
+        raise ValueError("history is empty")
+    if not 0 <= percent <= 100:
+        raise ValueError("percentile must be between 0 and 100")
+    rank = (count - 1) * percent / 100.0
+    lower = int(rank)
+    value = ordered[lower]
+    if rank > lower:
+        value += (ordered[lower + 1] - value) * (rank - lower)
+    return value
+
+
+def _compensated_add(total, compensation, value):
+    """Add ``value`` to a Neumaier compensated sum, returning the new ``(total, compensation)``.
+
+    ``compensation`` collects the low-order bits each addition rounds away,
+    so ``total + compensation`` stays accurate however many values are added
+    and taken away again.
+
+    """
+    result = total + value
+    if abs(total) >= abs(value):
+        compensation += (total - result) + value
+    else:
+        compensation += (value - result) + total
+    return result, compensation
+
+
+class _RunningWindow:
+    """Running aggregates over the most recent ``size`` samples of a History.
+
+    Keeps a compensated running sum for average/total and two monotonic
+    deques of ``(sequence, value)`` pairs for the sliding minimum and maximum,
+    so every push and every query is amortised O(1). NaN and infinite samples
+    are counted rather than summed, so they only affect the sum while they
+    are in the window.
+
+    """
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self._sum = 0.0
+        self._sum_error = 0.0
+        self._nans = 0
+        self._pos_infs = 0
+        self._neg_infs = 0
+        self._mins = deque()
+        self._maxs = deque()
+        self.order = None
+
+    @property
+    def finite(self):
+        """True if every sample in the window is finite."""
+        return not (self._nans or self._pos_infs or self._neg_infs)
+
+    @property
+    def sum(self):
+        if self._nans or (self._pos_infs and self._neg_infs):
+            return math.nan
+        if self._pos_infs:
+            return math.inf
+        if self._neg_infs:
+            return -math.inf
+        return self._sum + self._sum_error
+
+    def _count_nonfinite(self, value, step):
+        if math.isnan(value):
+            self._nans += step
+        elif value > 0:
+            self._pos_infs += step
+        else:
+            self._neg_infs += step
+
+    def push(self, seq, value, evicted=None):
+        """Add sample number ``seq``, dropping ``evicted`` from the running sum."""
+        if math.isfinite(value):
+            self._sum, self._sum_error = _compensated_add(self._sum, self._sum_error, value)
+        else:
+            self._count_nonfinite(value, 1)
+        if evicted is None:
+            self.count += 1
+        elif math.isfinite(evicted):
+            self._sum, self._sum_error = _compensated_add(self._sum, self._sum_error, -evicted)
+        else:
+            self._count_nonfinite(evicted, -1)
+
+        if self.order is not None:
+            # NaN has no place in a sorted order, so it is left out of order statistics
+            if not math.isnan(value):
+                self.order.insert(value)
+            if evicted is not None and not math.isnan(evicted):
+                self.order.remove(evicted)
+
+        oldest = seq - self.size
+
+        mins = self._mins
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((seq, value))
+        if mins[0][0] <= oldest:
+            mins.popleft()
+
+        maxs = self._maxs
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((seq, value))
+        if maxs[0][0] <= oldest:
+            maxs.popleft()
+
+    def average(self):
+        return self.sum / self.count if self.count else 0
+
+    def min(self):
+        return self._mins[0][1]
+
+    def max(self):
+        return self._maxs[0][1]
+
+
+class HistoryView(Sequence):
+    """Read-only view of a contiguous run of samples in a History.
+
+    Views index straight into the History's ring buffer rather than copying,
+    creating a ``HistoryEntry`` only when an item is accessed. A view keeps
+    referring to the same samples as new ones are appended, and raises
+    ``IndexError`` for any that have since aged out of the buffer.
+
+    """
+    __slots__ = '_history', '_start', '_stop'
+
+    def __init__(self, history, start, stop):
+        self._history = history
+        self._start = start  # Sequence number of the first sample
+        self._stop = stop    # Sequence number after the last sample
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def _check(self, seq):
+        history = self._history
+        if seq < history._seq - history._count:
+            raise IndexError("sample has aged out of the history")
+        return seq % history._history_depth
+
+    def _view(self, start, stop):
+        return HistoryView(self._history, start, stop)
+
+    def _get(self, seq):
+        slot = self._check(seq)
+        return HistoryEntry(self._history._values[slot], timestamp=self._history._timestamps[slot])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._view(self._start + start, self._start + max(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._get(self._start + index)
+
+    def __iter__(self):
+        for seq in range(self._start, self._stop):
+            yield self._get(seq)
+
+    def values(self):
+        """Yield just the sample values, oldest first."""
+        values = self._history._values
+        for seq in range(self._start, self._stop):
+            yield values[self._check(seq)]
+
+    def timestamps(self):
+        """Yield just the sample timestamps, oldest first."""
+        timestamps = self._history._timestamps
+        for seq in range(self._start, self._stop):
+            yield timestamps[self._check(seq)]
+
+
+class _CompassCache:
+    """Compass ``HistoryEntry`` for each ring buffer slot, tagged with its sample number."""
+    __slots__ = 'names', 'entries', 'seqs'
+
+    def __init__(self, names, depth):
+        self.names = names
+        self.entries = [None] * depth
+        self.seqs = array('q', [-1]) * depth
+
+
+class CompassView(HistoryView):
+    """View of a WindDirectionHistory translated to compass names.
+
+    Each sample is translated the first time it is accessed and the resulting
+    ``HistoryEntry`` is cached against its slot in the ring buffer, so
+    rendering the same samples again allocates nothing.
+
+    """
+    __slots__ = '_cache',
+
+    def __init__(self, history, start, stop, cache):
+        HistoryView.__init__(self, history, start, stop)
+        self._cache = cache
+
+    def _view(self, start, stop):
+        return CompassView(self._history, start, stop, self._cache)
+
+    def _get(self, seq):
+        slot = self._check(seq)
+        cache = self._cache
+        if cache.seqs[slot] != seq:
+            history = self._history
+            name = cache.names[cardinal_index(history._values[slot])]
+            cache.entries[slot] = HistoryEntry(name, timestamp=history._timestamps[slot])
+            cache.seqs[slot] = seq
+        return cache.entries[slot]
+
+    def values(self):
+        """Yield just the compass names, oldest first."""
+        for seq in range(self._start, self._stop):
+            yield self._get(seq).value
+
+
+class _CircularWindow(_RunningWindow):
+    """Running aggregates for angles in degrees.
+
+    Adds compensated running sums of the sine and cosine of each angle, from
+    which the circular mean and mean resultant length follow in O(1).
+
+    """
+    def __init__(self, size):
+        _RunningWindow.__init__(self, size)
+        self._sin_sum = self._sin_error = 0.0
+        self._cos_sum = self._cos_error = 0.0
+
+    @property
+    def sin_sum(self):
+        return self._sin_sum + self._sin_error if self.finite else math.nan
+
+    @property
+    def cos_sum(self):
+        return self._cos_sum + self._cos_error if self.finite else math.nan
+
+    def push(self, seq, value, evicted=None):
+        _RunningWindow.push(self, seq, value, evicted)
+        if math.isfinite(value):
+            radians = math.radians(value)
+            self._sin_sum, self._sin_error = _compensated_add(self._sin_sum, self._sin_error, math.sin(radians))
+            self._cos_sum, self._cos_error = _compensated_add(self._cos_sum, self._cos_error, math.cos(radians))
+        if evicted is not None and math.isfinite(evicted):
+            radians = math.radians(evicted)
+            self._sin_sum, self._sin_error = _compensated_add(self._sin_sum, self._sin_error, -math.sin(radians))
+            self._cos_sum, self._cos_error = _compensated_add(self._cos_sum, self._cos_error, -math.cos(radians))
+
+
 class History:
-    def __init__(self, history_depth=1200):
-        self._history = []
-        self.history_depth = history_depth
+    """Fixed-capacity history of timestamped values.
+
+    Values and timestamps are stored in two preallocated ``array('d')`` columns
+    used as a ring buffer, so appending a sample is O(1) and never allocates.
+
+    ``average``, ``total``, ``min`` and ``max`` are answered in O(1) from running
+    aggregates kept for the full depth and for every window size passed in
+    ``windows`` or to ``register_window``. ``median`` and ``percentile`` are
+    answered in O(log n) from those same windows, once the first such query on
+    a window has sorted its samples in O(n log n). Other sample counts fall
+    back to a scan of the requested samples.
+
+    Every query also accepts ``seconds`` in place of a sample count. The window
+    start is found by binary search over the timestamps, which are assumed to
+    be appended in non-decreasing order.
+
+    """
+    window_class = _RunningWindow
+
+    def __init__(self, history_depth=1200, windows=()):
+        self._history_depth = history_depth
+        self._values, self._timestamps = self._allocate(history_depth)
+        self._head = 0   # Slot the next sample will be written to
+        self._count = 0  # Number of valid samples in the buffer
+        self._seq = 0    # Total number of samples ever appended
+        self._windows = {}
+
+        for size in windows:
+            self.register_window(size)
+
+    @property
+    def history_depth(self):
+        return self._history_depth
+
+    @history_depth.setter
+    def history_depth(self, depth):
+        """Resize the ring buffer, keeping the most recent samples that still fit."""
+        if depth < 1:
+            raise ValueError("history_depth must be at least 1")
+        self._resize(depth)
+
+    def _resize(self, depth):
+        count = min(self._count, depth)
+        first = self._seq - count
+        values, timestamps = self._allocate(depth)
+        for offset, index in enumerate(range(self._count - count, self._count)):
+            slot = self._slot(index)
+            values[(first + offset) % depth] = self._values[slot]
+            timestamps[(first + offset) % depth] = self._timestamps[slot]
+        self._values, self._timestamps = values, timestamps
+        self._history_depth = depth
+        self._head = self._seq % depth
+        self._count = count
+
+        sizes = list(self._windows)
+        self._windows = {}
+        for size in sizes:
+            self.register_window(size)
+
+    def __len__(self):
+        return self._count
+
+    def _allocate(self, depth):
+        """Create the zeroed value and timestamp columns for the ring buffer."""
+        return array('d', bytes(8 * depth)), array('d', bytes(8 * depth))
+
+    def _slot(self, index):
+        """Convert a logical index (0 is the oldest sample) to a buffer slot."""
+        return (self._head - self._count + index) % self._history_depth
+
+    def _entry(self, index):
+        slot = self._slot(index)
+        return HistoryEntry(self._values[slot], timestamp=self._timestamps[slot])
+
+    def _iter_values(self, depth):
+        """Yield the values of the most recent ``depth`` samples, oldest first."""
+        values = self._values
+        for index in range(self._count - depth, self._count):
+            yield values[self._slot(index)]
+
+    def _bisect_time(self, timestamp):
+        """Find the logical index of the first sample at or after ``timestamp``."""
+        timestamps = self._timestamps
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[self._slot(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _sample_count(self, sample_over, seconds, now=None):
+        """Convert a time window into the number of samples it spans."""
+        if seconds is None:
+            return sample_over
+        if now is None:
+            now = time.time()
+        return self._count - self._bisect_time(now - seconds)
+
+    def register_window(self, size):
+        """Maintain O(1) aggregates for the most recent ``size`` samples."""
+        size = min(size, self._history_depth)
+        window = self._windows.get(size)
+        if window is None:
+            window = self.window_class(size)
+            depth = min(size, self._count)
+            first = self._seq - depth
+            for offset, value in enumerate(self._iter_values(depth)):
+                window.push(first + offset, value)
+            self._windows[size] = window
+        return window
+
+    def _window(self, sample_over):
+        """Find running aggregates covering ``sample_over`` samples, or None."""
+        if sample_over is None or sample_over >= self._count:
+            # The full depth window is only built once it is first needed
+            return self.register_window(self._history_depth)
+        return self._windows.get(sample_over)
 
     def append(self, value, timestamp=None):
-        self._history.append(HistoryEntry(value, timestamp=timestamp))
-        self._history = self._history[-self.history_depth:]  # Prune the buffer
+        head = self._head
+        depth = self._history_depth
 
-    def average(self, sample_over=None):
-        history = self.history(sample_over)
-        num_samples = len(history)
-        if num_samples == 0:
-            return 0
-        return sum([entry.value for entry in history]) / float(num_samples)
+        for window in self._windows.values():
+            evicted = self._values[(head - window.size) % depth] if self._count >= window.size else None
+            window.push(self._seq, value, evicted)
+
+        self._values[head] = value
+        self._timestamps[head] = timestamp if timestamp is not None else time.time()
+        self._head = (head + 1) % depth
+        self._seq += 1
+        if self._count < depth:
+            self._count += 1
+
+    def average(self, sample_over=None, seconds=None):
+        sample_over = self._sample_count(sample_over, seconds)
+        window = self._window(sample_over)
+        if window is not None:
+            return window.average()
+        return self.total(sample_over) / float(sample_over) if sample_over else 0
 
     def timespan(self):
-        return self._history[0].timestamp, self._history[-1].timestamp
+        if self._count == 0:
+            raise IndexError("history is empty")
+        return self._timestamps[self._slot(0)], self._timestamps[self._slot(self._count - 1)]
+
+    def min(self, sample_over=None, seconds=None):
+        sample_over = self._sample_count(sample_over, seconds)
+        if self._count == 0:
+            raise ValueError("history is empty")
+        window = self._window(sample_over)
+        if window is not None:
+            return window.min()
+        return min(self._iter_values(sample_over))
 
-    def min(self, sample_over=None):
-        return min(self.history(sample_over))
+    def max(self, sample_over=None, seconds=None):
+        sample_over = self._sample_count(sample_over, seconds)
+        if self._count == 0:
+            raise ValueError("history is empty")
+        window = self._window(sample_over)
+        if window is not None:
+            return window.max()
+        return max(self._iter_values(sample_over))
 
-    def max(self, sample_over=None):
-        return max(self.history(sample_over))
+    def median(self, sample_over=None, seconds=None):
+        return self.percentile(50, sample_over, seconds)
 
-    def median(self, sample_over=None):
-        history = self.history(sample_over)
-        median = int(len(history) / 2)
-        return history[median].value
+    def percentile(self, percent, sample_over=None, seconds=None):
+        """Percentile (0-100) of the most recent samples, interpolating between ranks.
 
-    def total(self, sample_over=None):
-        history = self.history(sample_over)
-        return sum([entry.value for entry in history])
+        NaN samples are ignored, if every sample is NaN the result is NaN.
+
+        """
+        sample_over = self._sample_count(sample_over, seconds)
+        window = self._window(sample_over)
+        if window is None:
+            ordered = sorted(value for value in self._iter_values(sample_over) if not math.isnan(value))
+            count = sample_over
+        else:
+            if window.order is None:
+                # Order statistics are only maintained once they are first needed, the first query sorts the window
+                values = sorted(value for value in self._iter_values(window.count) if not math.isnan(value))
+                window.order = _IndexableSkiplist.from_sorted(values, window.size)
+            ordered = window.order
+            count = window.count
+        if count and not len(ordered):
+            return math.nan
+        return _percentile(ordered, len(ordered), percent)
+
+    def total(self, sample_over=None, seconds=None):
+        sample_over = self._sample_count(sample_over, seconds)
+        window = self._window(sample_over)
+        if window is not None:
+            return window.sum
+        return math.fsum(self._iter_values(sample_over))
 
     def latest(self):
-        return self._history[-1]
+        if self._count == 0:
+            raise IndexError("history is empty")
+        return self._entry(self._count - 1)
 
     def history(self, depth=None):
         if depth is None:
-            return self._history
-        depth = min(depth, len(self._history))
-        return self._history[-depth:]
+            depth = self._count
+        depth = min(depth, self._count)
+        return HistoryView(self, self._seq - depth, self._seq)
+
+    def window(self, seconds, now=None):
+        """View of the samples from the last ``seconds`` before ``now``."""
+        return self.history(self._sample_count(None, seconds, now))
+
+
+class Rollup:
+    """Summary of the samples that fell within one rollup period.
+
+    ``value`` is the mean, so a list of rollups can be drawn or averaged
+    anywhere a list of ``HistoryEntry`` is expected.
+
+    """
+    __slots__ = 'timestamp', 'min', 'max', 'total', 'count'
+
+    def __init__(self, timestamp, value):
+        self.timestamp = timestamp  # Start of the period
+        self.min = value
+        self.max = value
+        self.total = value
+        self.count = 1
+
+    def add(self, value):
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.total += value
+        self.count += 1
+
+    def copy(self):
+        rollup = Rollup(self.timestamp, self.min)
+        rollup.max = self.max
+        rollup.total = self.total
+        rollup.count = self.count
+        return rollup
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+    @property
+    def value(self):
+        return self.mean
+
+
+class _RollupTier:
+    """Fixed number of consecutive rollups of a fixed period."""
+    def __init__(self, period, depth):
+        self.period = period
+        self.depth = depth
+        self.rollups = deque(maxlen=depth)
+        self.current = None  # Rollup still accepting samples
+
+    def add(self, value, timestamp):
+        start = timestamp - (timestamp % self.period)
+        current = self.current
+        if current is not None and current.timestamp == start:
+            current.add(value)
+            return
+        if current is not None:
+            self.rollups.append(current)
+        self.current = Rollup(start, value)
+
+    def covers(self, cutoff):
+        """True if no rollup overlapping ``cutoff`` has been discarded yet."""
+        rollups = self.rollups
+        return len(rollups) < self.depth or rollups[0].timestamp <= cutoff
+
+    def since(self, cutoff):
+        """Rollups for the periods ending after ``cutoff``, oldest first."""
+        current = self.current
+        result = [current.copy()] if current is not None and current.timestamp + self.period > cutoff else []
+        for rollup in reversed(self.rollups):
+            if rollup.timestamp + self.period <= cutoff:
+                break
+            result.append(rollup)
+        result.reverse()
+        return result
+
+
+class NumpyHistory(History):
+    """History whose ring buffer columns are NumPy arrays.
+
+    ``values`` and ``timestamps`` are read-only ndarray views of the samples in
+    time order. They share memory with the ring buffer unless it has wrapped,
+    in which case a single concatenation puts the two halves in order. Views
+    reflect later appends, so copy them if a stable snapshot is needed.
+
+    Requires numpy.
+
+    """
+    def __init__(self, history_depth=1200, windows=()):
+        if numpy is None:
+            raise ImportError("NumpyHistory requires numpy")
+        History.__init__(self, history_depth, windows)
+
+    def _allocate(self, depth):
+        return numpy.zeros(depth), numpy.zeros(depth)
+
+    def _column(self, column, depth):
+        depth = min(depth, self._count)
+        start = (self._head - depth) % self._history_depth
+        if start + depth <= self._history_depth:
+            view = column[start:start + depth]
+        else:
+            view = numpy.concatenate((column[start:], column[:self._head]))
+        view.flags.writeable = False
+        return view
+
+    @property
+    def values(self):
+        return self._column(self._values, self._count)
+
+    @property
+    def timestamps(self):
+        return self._column(self._timestamps, self._count)
+
+    def arrays(self, sample_over=None, seconds=None):
+        """Values and timestamps of the most recent samples as ndarrays."""
+        sample_over = self._sample_count(sample_over, seconds)
+        if sample_over is None:
+            sample_over = self._count
+        return self._column(self._values, sample_over), self._column(self._timestamps, sample_over)
+
+    def std(self, sample_over=None, seconds=None):
+        """Population standard deviation of the most recent samples."""
+        values, _ = self.arrays(sample_over, seconds)
+        return float(numpy.std(values)) if len(values) else 0
+
+    def percentiles(self, percents, sample_over=None, seconds=None):
+        """Several percentiles (0-100) of the most recent samples in one pass."""
+        values, _ = self.arrays(sample_over, seconds)
+        if len(values) == 0:
+            raise ValueError("history is empty")
+        return numpy.percentile(values, percents)
+
+
+class PersistentHistory(History):
+    """History stored in a fixed-size memory-mapped ring file.
+
+    The file holds a small header followed by the value and timestamp
+    columns, so appending is a pair of memory writes and reopening an
+    existing file only maps it, with no log to replay.
+
+    Samples are flushed to storage every ``flush_interval`` seconds, or by
+    calling ``flush``/``close``, rather than on every append. A flush syncs
+    the columns first and only then publishes the new sample count in the
+    header, so after a crash or power loss the file reopens with the samples
+    of the last flush. Samples appended since then are lost, and any that
+    had reached storage over the oldest samples are dropped on reopening.
+
+    """
+    MAGIC = b"WHATHIST"
+    VERSION = 1
+    SCHEMA = b"dd"  # Value, timestamp
+    HEADER = struct.Struct("=8sH6sQ")
+    SEQ = struct.Struct("=Q")
+    SEQ_OFFSET = HEADER.size
+    HEADER_SIZE = 64
+
+    def __init__(self, path, history_depth=1200, windows=(), flush_interval=60.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        History.__init__(self, history_depth)
+        self._seq, = self.SEQ.unpack_from(self._mmap, self.SEQ_OFFSET)
+        self._count = min(self._seq, history_depth)
+        self._head = self._seq % history_depth
+        # Unflushed samples may have overwritten the oldest ones before a power loss
+        newest = self._timestamps[self._slot(self._count - 1)] if self._count else 0.0
+        while self._count and self._timestamps[self._slot(0)] > newest:
+            self._count -= 1
+        self._last_flush = time.monotonic()
+
+        for size in windows:
+            self.register_window(size)
+
+    def _resize(self, depth):
+        raise ValueError(f"{self.path} holds a history_depth of {self._history_depth}, it can't be resized")
+
+    def _allocate(self, depth):
+        size = self.HEADER_SIZE + 16 * depth
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+        self._file = open(self.path, "r+b" if exists else "w+b")
+        if exists:
+            magic, version, schema, capacity = self.HEADER.unpack(self._file.read(self.HEADER.size))
+            if magic != self.MAGIC or version != self.VERSION or schema.rstrip(b"\0") != self.SCHEMA:
+                self._file.close()
+                raise ValueError(f"{self.path} is not a weatherhat history file")
+            if capacity != depth or os.path.getsize(self.path) != size:
+                self._file.close()
+                raise ValueError(f"{self.path} holds a history_depth of {capacity}, not {depth}")
+        else:
+            self._file.truncate(size)
+            self._file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.SCHEMA, depth))
+            self._file.write(self.SEQ.pack(0))
+            self._file.flush()
+
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        data = memoryview(self._mmap)
+        values = data[self.HEADER_SIZE:self.HEADER_SIZE + 8 * depth].cast("d")
+        timestamps = data[self.HEADER_SIZE + 8 * depth:size].cast("d")
+        data.release()
+        return values, timestamps
+
+    def append(self, value, timestamp=None):
+        History.append(self, value, timestamp)
+        if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the new samples back to the file, then publish them in the header."""
+        # Storage may write dirty pages in any order, so the count must only reach it after the samples
+        self._mmap.flush()
+        self.SEQ.pack_into(self._mmap, self.SEQ_OFFSET, self._seq)
+        self._mmap.flush(0, self.HEADER_SIZE)
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._mmap.closed:
+            return
+        self.flush()
+        self._values.release()
+        self._timestamps.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TieredHistory(History):
+    """History with raw samples plus coarser rollups for long-term retention.
+
+    Every sample is added to the raw ring buffer and to the open rollup of
+    each tier in O(1). By default tiers of 1 minute (1 day), 1 hour (30 days)
+    and 1 day (1 year) are kept, costing a few hundred kilobytes at most.
+
+    """
+    tiers = (
+        (60, 24 * 60),
+        (60 * 60, 30 * 24),
+        (24 * 60 * 60, 366)
+    )
+
+    def __init__(self, history_depth=1200, windows=(), tiers=None):
+        History.__init__(self, history_depth, windows)
+        tiers = self.tiers if tiers is None else tiers
+        self._tiers = [_RollupTier(period, depth) for period, depth in sorted(tiers)]
+
+    def append(self, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        History.append(self, value, timestamp)
+        for tier in self._tiers:
+            tier.add(value, timestamp)
+
+    def _raw_covers(self, cutoff):
+        return self._count < self._history_depth or self._timestamps[self._slot(0)] <= cutoff
+
+    def rollups(self, seconds, resolution=None, now=None):
+        """Samples covering the last ``seconds``, at the coarsest suitable resolution.
+
+        Picks the coarsest tier whose period is no longer than ``resolution``
+        and which still holds the whole span. If no tier qualifies, the raw
+        samples are returned when they cover the span, otherwise the finest
+        tier that does. Returns a HistoryView of raw samples or a list of
+        ``Rollup``, both of which have ``value`` and ``timestamp`` attributes.
+
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - seconds
+
+        if resolution is not None:
+            for tier in reversed(self._tiers):
+                if tier.period <= resolution and tier.covers(cutoff):
+                    return tier.since(cutoff)
+
+        if self._raw_covers(cutoff):
+            return self.window(seconds, now)
+
+        for tier in self._tiers:
+            if tier.covers(cutoff):
+                return tier.since(cutoff)
+
+        return self._tiers[-1].since(cutoff)
 
 
 class WindSpeedHistory(History):
@@ -106,25 +975,72 @@ class WindSpeedHistory(History):
 
     def gust(self, seconds=3.0):
         """Wind gust in meters/second."""
-        cut_off_time = time.time() - seconds
-        samples = [entry.value for entry in self.history() if entry.timestamp >= cut_off_time]
-        return max(samples)
+        return self.max(seconds=seconds)
 
 
 class WindDirectionHistory(History):
+    """History of wind directions in degrees.
+
+    Averages are circular, so a vane flapping between 350 and 10 degrees
+    averages to North rather than South.
+
+    """
+    window_class = _CircularWindow
+
+    def __init__(self, history_depth=1200, windows=()):
+        History.__init__(self, history_depth, windows)
+        self._compass_views = {False: None, True: None}
+
+    def _resize(self, depth):
+        History._resize(self, depth)
+        # The compass caches are indexed by ring buffer slot
+        self._compass_views = {False: None, True: None}
+
+    def _resultant(self, sample_over=None, seconds=None):
+        """Sum the unit vectors of the requested angles."""
+        sample_over = self._sample_count(sample_over, seconds)
+        window = self._window(sample_over)
+        if window is not None:
+            return window.sin_sum, window.cos_sum, window.count
+        radians = [math.radians(value) for value in self._iter_values(sample_over)]
+        return math.fsum(map(math.sin, radians)), math.fsum(map(math.cos, radians)), len(radians)
+
+    def circular_average(self, sample_over=None, seconds=None):
+        """Circular mean of the wind direction in degrees, from 0 up to but not including 360."""
+        sin_sum, cos_sum, count = self._resultant(sample_over, seconds)
+        if count == 0:
+            return 0
+        degrees = math.degrees(math.atan2(sin_sum, cos_sum)) % 360
+        # A tiny negative angle rounds up to exactly 360 after the modulo
+        return 0.0 if degrees >= 360.0 else degrees
+
+    def steadiness(self, sample_over=None, seconds=None):
+        """Mean resultant length of the wind direction.
+
+        1.0 for a perfectly steady wind, approaching 0.0 as the direction
+        becomes evenly spread.
+
+        """
+        sin_sum, cos_sum, count = self._resultant(sample_over, seconds)
+        if count == 0:
+            return 0
+        return min(1.0, math.hypot(sin_sum, cos_sum) / count)
+
+    def circular_variance(self, sample_over=None, seconds=None):
+        """Circular variance of the wind direction, from 0.0 (steady) to 1.0."""
+        return 1.0 - self.steadiness(sample_over, seconds)
+
     def degrees_to_cardinal(self, degrees):
-        value, cardinal = min(wind_degrees_to_cardinal.items(), key=lambda item: abs(item[0] - degrees))
-        return cardinal
+        return degrees_to_cardinal(degrees)
 
     def degrees_to_short_cardinal(self, degrees):
-        value, cardinal = min(wind_degrees_to_short_cardinal.items(), key=lambda item: abs(item[0] - degrees))
-        return cardinal
+        return degrees_to_short_cardinal(degrees)
 
     def average_compass(self, sample_over=None):
-        return self.degrees_to_cardinal(self.average(sample_over))
+        return self.degrees_to_cardinal(self.circular_average(sample_over))
 
     def average_short_compass(self, sample_over=None):
-        return self.degrees_to_short_cardinal(self.average(sample_over))
+        return self.degrees_to_short_cardinal(self.circular_average(sample_over))
 
     def latest_compass(self):
         return self.degrees_to_cardinal(self.latest().value)
@@ -132,8 +1048,22 @@ class WindDirectionHistory(History):
     def latest_short_compass(self):
         return self.degrees_to_short_cardinal(self.latest().value)
 
+    def _compass_view(self, short, depth):
+        """Reuse the last compass view while it still covers the requested samples."""
+        view = self._compass_views[short]
+        if depth is None:
+            depth = self._count
+        start = self._seq - min(depth, self._count)
+        if view is None or view._start != start or view._stop != self._seq:
+            if view is not None:
+                cache = view._cache
+            else:
+                cache = _CompassCache(_short_cardinals if short else _cardinals, self._history_depth)
+            view = self._compass_views[short] = CompassView(self, start, self._seq, cache)
+        return view
+
     def history_compass(self, depth=None):
-        return [HistoryEntry(self.degrees_to_cardinal(entry.value), timestamp=entry.timestamp) for entry in self.history(depth)]
+        return self._compass_view(False, depth)
 
     def history_short_compass(self, depth=None):
-        return [HistoryEntry(self.degrees_to_short_cardinal(entry.value), timestamp=entry.timestamp) for entry in self.history(depth)]
+        return self._compass_view(True, depth)
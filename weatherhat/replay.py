@@ -0,0 +1,426 @@
+"""Record Weather HAT data, and replay it in place of the hardware.
+
+A trace is an iterable of TraceEvent, in timestamp order. Pass one to a
+ReplayBackend and hand that to WeatherHAT to run without any hardware:
+
+    backend = ReplayBackend(trace, speed=None)
+    sensor = WeatherHAT(backend=backend)
+    while backend.advance(5.0):
+        reading = sensor.update(interval=60.0)
+
+Traces are recorded to compact binary files by RecordingBackend, and read
+back lazily by TraceReader:
+
+    sensor = WeatherHAT(backend=RecordingBackend(HardwareBackend(), "weather.trace"))
+    ...
+    backend = ReplayBackend(TraceReader("weather.trace"), speed=None)
+
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from . import Backend
+
+TraceEvent = namedtuple("TraceEvent", ("timestamp", "source", "values"))
+TraceEvent.__doc__ = """One recorded measurement.
+
+``source`` is one of SOURCES, ``values`` holds:
+
+* "bme280" - (temperature, pressure, humidity)
+* "lux" - (lux,)
+* "vane" - (voltage,)
+* "counters" - (wind pulses, rain ticks) counted since the previous counters event, each raises an interrupt
+
+"""
+
+SOURCES = ("bme280", "lux", "vane", "counters")
+SOURCE_VALUES = (3, 1, 1, 2)  # Number of values for each source
+
+
+class ReplayBackend(Backend):
+    """Backend that plays back a trace of TraceEvent.
+
+    Sensor reads return the most recent recorded values, and switch counters
+    advance by the recorded pulses, wrapping at 7 bits like the real ones.
+    Each counters event waits, up to ``handler_timeout``, for the counters
+    to be read after the previous one, so no pulses are lost to a wrap
+    however fast the trace plays.
+
+    With a ``speed`` the trace plays in real time, multiplied by ``speed``,
+    from when WeatherHAT enables interrupts. With ``speed=None`` time stands
+    still until advance() is called, which makes replay deterministic and as
+    fast as the code under test.
+
+    :param trace: Iterable of TraceEvent in timestamp order, consumed lazily
+    :param speed: Playback speed multiple, or None to advance time manually
+    :param handler_timeout: Longest time to wait for each interrupt to be handled
+    :param start: Trace time to start the clock at, the first event's timestamp by default
+
+    """
+    def __init__(self, trace, speed=1.0, handler_timeout=1.0, start=None):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive, or None")
+        self.speed = speed
+        self.handler_timeout = handler_timeout
+        self.transactions = 0
+
+        self._trace = iter(trace)
+        self._next = next(self._trace, None)
+        self._condition = threading.Condition()
+
+        self._bme280 = (0.0, 0.0, 0.0)
+        self._lux = 0.0
+        self._vane = 0.0
+        self._wind_counter = 0
+        self._rain_counter = 0
+
+        # Edges raised by counters events, and how many had been raised at the last counter read
+        self._edges_raised = 0
+        self._edges_read = 0
+        self._first_edge_time = None
+        self._edge_r, self._edge_w = os.pipe()
+        os.set_blocking(self._edge_r, False)
+
+        if start is None:
+            start = self._next.timestamp if self._next is not None else 0.0
+        self._t_trace = start
+        self._t_wall = time.monotonic()
+        self._closed = False
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def clock_rate(self):
+        return self.speed
+
+    @property
+    def finished(self):
+        """True once every event in the trace has been played."""
+        return self._next is None
+
+    def _now(self):
+        if self.speed is None or self._thread is None:
+            return self._t_trace
+        return self._t_trace + (time.monotonic() - self._t_wall) * self.speed
+
+    def _edges_handled(self):
+        return self._edges_read >= self._edges_raised
+
+    def _play(self, until, force=False):
+        """Apply events up to ``until``, raising an interrupt edge for a counters event.
+
+        Stops at a counters event until the counters have been read since
+        the previous edge, unless ``force`` is set, which lets one through.
+        Returns the number of edges raised.
+
+        """
+        edges = 0
+        with self._condition:
+            while self._next is not None and self._next.timestamp <= until:
+                event = self._next
+                if event.source == "counters" and not self._edges_handled() and not (force and not edges):
+                    break
+                if event.source == "bme280":
+                    self._bme280 = tuple(event.values[:3])
+                elif event.source == "lux":
+                    self._lux = event.values[0]
+                elif event.source == "vane":
+                    self._vane = event.values[0]
+                elif event.source == "counters":
+                    wind, rain = event.values[:2]
+                    self._wind_counter = (self._wind_counter + int(wind)) & 0x7F
+                    self._rain_counter = (self._rain_counter + int(rain)) & 0x7F
+                    self._edges_raised += 1
+                    edges += 1
+                else:
+                    raise ValueError(f"Unknown trace source {event.source!r}")
+                self._next = next(self._trace, None)
+        if edges:
+            if self._first_edge_time is None:
+                self._first_edge_time = time.monotonic()
+            os.write(self._edge_w, b"\0" * edges)
+        return edges
+
+    def _wait_for_handler(self):
+        """Wait for the last edge to be handled, returning False if it wasn't in time."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._stop.is_set() or self._edges_handled(), self.handler_timeout)
+
+    def enable_interrupts(self):
+        if self.speed is not None and self._thread is None:
+            # Start the clock now, so no events are played before WeatherHAT is ready for them
+            self._t_wall = time.monotonic()
+            self._thread = threading.Thread(target=self._t_replay, daemon=True)
+            self._thread.start()
+
+    def _t_replay(self):
+        force = False
+        while self._next is not None:
+            delay = (self._next.timestamp - self._now()) / self.speed
+            if delay > 0 and self._stop.wait(delay):
+                break
+            self._play(self._now(), force)
+            force = not self._wait_for_handler()
+            if self._stop.is_set():
+                break
+
+    def advance(self, seconds):
+        """Move the clock on by ``seconds``, playing every event along the way.
+
+        Only for ``speed=None``. Each counters event waits, up to
+        ``handler_timeout``, for its interrupt to be handled, so pulses are
+        counted separately and timestamped at the time they were recorded.
+
+        Returns False once the trace has been played to the end.
+
+        """
+        if self.speed is not None:
+            raise RuntimeError("advance() needs a ReplayBackend with speed=None.")
+        until = self._t_trace + seconds
+        force = False
+        while self._next is not None and self._next.timestamp <= until:
+            self._t_trace = max(self._t_trace, self._next.timestamp)
+            self._play(self._t_trace, force)
+            force = not self._wait_for_handler()
+        self._t_trace = until
+        return self._next is not None
+
+    def read_bme280(self):
+        self.transactions += 1
+        self._play(self._now())
+        return self._bme280
+
+    def read_lux(self):
+        self.transactions += 1
+        self._play(self._now())
+        return self._lux
+
+    def read_vane(self):
+        self.transactions += 1
+        self._play(self._now())
+        return self._vane
+
+    def read_switch_counters(self):
+        self.transactions += 1
+        with self._condition:
+            self._edges_read = self._edges_raised
+            self._condition.notify_all()
+            return self._wind_counter, self._rain_counter
+
+    def clear_switch_counters(self):
+        self.transactions += 2
+        with self._condition:
+            self._wind_counter = 0
+            self._rain_counter = 0
+
+    @property
+    def interrupt_fd(self):
+        return self._edge_r
+
+    def read_interrupts(self):
+        try:
+            edges = len(os.read(self._edge_r, 4096))
+        except BlockingIOError:
+            return 0
+        self.edge_time, self._first_edge_time = self._first_edge_time, None
+        return edges
+
+    def time(self):
+        return self._now()
+
+    def monotonic(self):
+        return self._now()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._edge_r)
+        os.close(self._edge_w)
+
+
+class TraceWriter:
+    """Append TraceEvent records to a binary trace file.
+
+    The file is a small header followed by fixed-size records of a double
+    timestamp, a source byte and three float values, 21 bytes in all.
+    Writes are buffered, call flush() or close() to make sure they are on disk.
+    Appending to an existing trace first drops any partial record at its end.
+
+    """
+    MAGIC = b"WHATTRCE"
+    VERSION = 1
+    SCHEMA = b"dB3f"  # Timestamp, source, values
+    HEADER = struct.Struct("=8sH6s")
+    HEADER_SIZE = 16
+    RECORD = struct.Struct("=dB3f")
+
+    def __init__(self, path, buffer_size=65536):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, "r+b") as f:
+                _check_header(f.read(self.HEADER.size), path)
+                # Drop a record cut short by a crash, so new records line up after the last whole one
+                count = (os.path.getsize(path) - self.HEADER_SIZE) // self.RECORD.size
+                f.truncate(self.HEADER_SIZE + count * self.RECORD.size)
+        self._file = open(path, "ab", buffering=buffer_size)
+        if not exists:
+            self._file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.SCHEMA).ljust(self.HEADER_SIZE, b"\0"))
+
+    def write(self, event):
+        values = tuple(event.values) + (0.0, 0.0, 0.0)
+        self._file.write(self.RECORD.pack(event.timestamp, SOURCES.index(event.source), *values[:3]))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _check_header(header, path):
+    if len(header) != TraceWriter.HEADER.size:
+        raise ValueError(f"{path} is not a weatherhat trace file")
+    magic, version, schema = TraceWriter.HEADER.unpack(header)
+    if magic != TraceWriter.MAGIC or version != TraceWriter.VERSION or schema.rstrip(b"\0") != TraceWriter.SCHEMA:
+        raise ValueError(f"{path} is not a weatherhat trace file")
+
+
+class TraceReader:
+    """Memory-mapped binary trace file, as written by TraceWriter.
+
+    Records are unpacked one at a time as they are iterated over, so opening
+    even a multi-day trace only maps it. A record cut short by a crash while
+    recording is ignored.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.path.getsize(path)
+        _check_header(self._file.read(TraceWriter.HEADER.size), path)
+        self._count = max(0, size - TraceWriter.HEADER_SIZE) // TraceWriter.RECORD.size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._count else None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        unpack_from = TraceWriter.RECORD.unpack_from
+        offset = TraceWriter.HEADER_SIZE
+        for _ in range(self._count):
+            timestamp, source, *values = unpack_from(self._mmap, offset)
+            offset += TraceWriter.RECORD.size
+            yield TraceEvent(timestamp, SOURCES[source], tuple(values[:SOURCE_VALUES[source]]))
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RecordingBackend(Backend):
+    """Backend that records every reading made through another backend to a trace file.
+
+    Counter reads are recorded as the pulses counted since the previous
+    read, so the trace replays with ReplayBackend. Closing the backend
+    closes the trace file along with the wrapped backend.
+
+    :param backend: Backend to read from, usually a HardwareBackend
+    :param path: Trace file to append to
+    :param buffer_size: Bytes of records to buffer before writing them out
+
+    """
+    def __init__(self, backend, path, buffer_size=65536):
+        self.backend = backend
+        self._writer = TraceWriter(path, buffer_size)
+        self._wind_counter = 0
+        self._rain_counter = 0
+
+    def _record(self, source, values):
+        self._writer.write(TraceEvent(self.backend.time(), source, values))
+        return values
+
+    @property
+    def transactions(self):
+        return self.backend.transactions
+
+    @property
+    def edge_time(self):
+        return self.backend.edge_time
+
+    @property
+    def clock_rate(self):
+        return self.backend.clock_rate
+
+    def setup(self, profile):
+        self.backend.setup(profile)
+
+    def enable_interrupts(self):
+        self.backend.enable_interrupts()
+
+    def read_bme280(self):
+        return self._record("bme280", tuple(self.backend.read_bme280()))
+
+    def read_lux(self):
+        return self._record("lux", (self.backend.read_lux(),))[0]
+
+    def read_vane(self):
+        return self._record("vane", (self.backend.read_vane(),))[0]
+
+    def read_switch_counters(self):
+        wind, rain = self.backend.read_switch_counters()
+        self._record("counters", ((wind - self._wind_counter) & 0x7F, (rain - self._rain_counter) & 0x7F))
+        self._wind_counter, self._rain_counter = wind, rain
+        return wind, rain
+
+    def clear_switch_counters(self):
+        self.backend.clear_switch_counters()
+        self._wind_counter = 0
+        self._rain_counter = 0
+
+    @property
+    def interrupt_fd(self):
+        return self.backend.interrupt_fd
+
+    def read_interrupts(self):
+        return self.backend.read_interrupts()
+
+    def time(self):
+        return self.backend.time()
+
+    def monotonic(self):
+        return self.backend.monotonic()
+
+    def flush(self):
+        """Write buffered records out to the trace file."""
+        self._writer.flush()
+
+    def close(self):
+        self.backend.close()
+        self._writer.close()
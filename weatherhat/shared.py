@@ -0,0 +1,188 @@
+"""Share live readings between processes.
+
+Only one process can own the Weather HAT's I2C bus and interrupt line. It
+publishes each Reading to a named shared memory block:
+
+    sensor = WeatherHAT()
+    sensor.start_publishing("weatherhat")
+
+Any number of other processes can then read the latest Reading, and recent
+history, without locking and without the hardware libraries installed:
+
+    readings = SharedReadings("weatherhat")
+    print(readings.latest().temperature)
+
+The block holds a header and a ring buffer of Readings packed as doubles.
+Writes are guarded by a seqlock: the sequence number is odd while a Reading
+is being written, and readers retry any copy that overlapped a write.
+
+"""
+import struct
+import threading
+import time
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    raise ImportError("weatherhat.shared requires Python 3.8 or later, for multiprocessing.shared_memory") from None
+
+from . import Reading
+
+MAGIC = b"WHATSHRD"
+VERSION = 1
+HEADER = struct.Struct("=8sHHI")  # Magic, version, fields per reading, history depth
+SEQ = struct.Struct("=Q")
+SEQ_OFFSET = 16
+COUNT = struct.Struct("=Q")       # Total readings published
+COUNT_OFFSET = 24
+HEADER_SIZE = 64
+RECORD = struct.Struct(f"={len(Reading._fields)}d")
+
+
+def _attach(name):
+    """Attach to an existing block without this process taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attached block is tracked, and unlinked when this process exits
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class ReadingPublisher:
+    """Write Readings to a named shared memory block, see WeatherHAT.start_publishing().
+
+    :param name: Name of the shared memory block
+    :param history_depth: Number of recent Readings to keep
+
+    """
+    def __init__(self, name="weatherhat", history_depth=1200):
+        self.name = name
+        self.history_depth = history_depth
+        size = HEADER_SIZE + RECORD.size * history_depth
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            seq = 0
+        except FileExistsError:
+            # Left behind by a publisher that didn't exit cleanly, readers may still be attached
+            self._shm = shared_memory.SharedMemory(name=name)
+            if self._shm.size < size:
+                self._shm.close()
+                raise ValueError(f"Shared memory {name!r} exists and is too small for a history_depth of {history_depth}")
+            seq, = SEQ.unpack_from(self._shm.buf, SEQ_OFFSET)
+            seq = (seq | 1) + 1
+
+        self._buf = self._shm.buf
+        self._lock = threading.Lock()
+        self._count = 0
+        SEQ.pack_into(self._buf, SEQ_OFFSET, seq + 1)
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, len(Reading._fields), history_depth)
+        COUNT.pack_into(self._buf, COUNT_OFFSET, 0)
+        self._seq = seq + 2
+        SEQ.pack_into(self._buf, SEQ_OFFSET, self._seq)
+
+    def publish(self, reading):
+        """Write ``reading`` as the latest Reading."""
+        with self._lock:
+            buf = self._buf
+            if buf is None:
+                return
+            SEQ.pack_into(buf, SEQ_OFFSET, self._seq + 1)
+            RECORD.pack_into(buf, HEADER_SIZE + RECORD.size * (self._count % self.history_depth), *reading)
+            self._count += 1
+            COUNT.pack_into(buf, COUNT_OFFSET, self._count)
+            self._seq += 2
+            SEQ.pack_into(buf, SEQ_OFFSET, self._seq)
+
+    def close(self, unlink=True):
+        """Detach from the block, and remove it unless ``unlink`` is False."""
+        with self._lock:
+            if self._buf is None:
+                return
+            self._buf.release()
+            self._buf = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+class SharedReadings:
+    """Read Readings published by another process, without locking.
+
+    :param name: Name of the shared memory block the publisher writes to
+    :param timeout: Longest time to retry a read while the publisher is mid-write
+
+    """
+    def __init__(self, name="weatherhat", timeout=1.0):
+        self.name = name
+        self.timeout = timeout
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        magic, version, fields, history_depth = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION or fields != len(Reading._fields):
+            self.close()
+            raise ValueError(f"Shared memory {name!r} does not hold weatherhat readings")
+        self.history_depth = history_depth
+
+    def _consistent(self, copy):
+        """Call ``copy`` until it runs without overlapping a write."""
+        deadline = None
+        while True:
+            seq, = SEQ.unpack_from(self._buf, SEQ_OFFSET)
+            if not seq & 1:
+                result = copy()
+                if SEQ.unpack_from(self._buf, SEQ_OFFSET)[0] == seq:
+                    return result
+            if deadline is None:
+                deadline = time.monotonic() + self.timeout
+            elif time.monotonic() > deadline:
+                raise RuntimeError(f"Publisher of {self.name!r} stopped part way through a write")
+            time.sleep(0)
+
+    def __len__(self):
+        """Total number of Readings published so far."""
+        return COUNT.unpack_from(self._buf, COUNT_OFFSET)[0]
+
+    def _reading(self, values):
+        return Reading(*values[:-1], bool(values[-1]))
+
+    def latest(self):
+        """The most recently published Reading, or None if there isn't one yet."""
+        def copy():
+            count, = COUNT.unpack_from(self._buf, COUNT_OFFSET)
+            if count == 0:
+                return None
+            return RECORD.unpack_from(self._buf, HEADER_SIZE + RECORD.size * ((count - 1) % self.history_depth))
+
+        values = self._consistent(copy)
+        return self._reading(values) if values is not None else None
+
+    def history(self, depth=None):
+        """Up to ``depth`` of the most recent Readings, oldest first."""
+        def copy():
+            count, = COUNT.unpack_from(self._buf, COUNT_OFFSET)
+            available = min(count, self.history_depth)
+            wanted = available if depth is None else min(depth, available)
+            start = (count - wanted) % self.history_depth
+            end = start + wanted
+            if end <= self.history_depth:
+                return bytes(self._buf[HEADER_SIZE + RECORD.size * start:HEADER_SIZE + RECORD.size * end])
+            # The requested Readings wrap around the end of the ring buffer
+            return (bytes(self._buf[HEADER_SIZE + RECORD.size * start:HEADER_SIZE + RECORD.size * self.history_depth])
+                    + bytes(self._buf[HEADER_SIZE:HEADER_SIZE + RECORD.size * (end - self.history_depth)]))
+
+        return [self._reading(values) for values in RECORD.iter_unpack(self._consistent(copy))]
+
+    def close(self):
+        if self._buf is None:
+            return
+        self._buf.release()
+        self._buf = None
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,115 @@
+"""Simulated Weather HAT, for running examples and applications without hardware.
+
+    sensor = WeatherHAT(backend=SimulatedBackend())
+
+Temperature, pressure, humidity and light follow slow sine waves, the wind
+vane wanders between compass points, and the anemometer and rain gauge
+raise interrupts as their simulated switch counters advance.
+
+"""
+import math
+import os
+import random
+import threading
+import time
+
+from . import ANE_CIRCUMFERENCE, ANE_FACTOR, RAIN_MM_PER_TICK, Backend, wind_direction_to_degrees
+
+
+class SimulatedBackend(Backend):
+    """Backend that makes up plausible weather.
+
+    :param wind_speed: Average wind speed in meters/second, it gusts and lulls around this
+    :param rain: Peak rainfall in millimeters/hour
+    :param tick: Time between simulated switch counter updates, in seconds
+
+    """
+    def __init__(self, wind_speed=5.0, rain=2.0, tick=0.25):
+        self.wind_speed = wind_speed
+        self.rain = rain
+        self.tick = tick
+        self.transactions = 0
+
+        self._lock = threading.Lock()
+        self._wind_counter = 0
+        self._rain_counter = 0
+        self._wind_pulses = 0.0  # Fractional pulses carried over between ticks
+        self._rain_ticks = 0.0
+        self._vane = random.choice(list(wind_direction_to_degrees))
+
+        self._edge_r, self._edge_w = os.pipe()
+        os.set_blocking(self._edge_r, False)
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _t_counters(self):
+        # Two pulses per rotation, see WeatherHAT.wind_counts_to_ms()
+        pulses_per_meter = 2.0 * 100.0 / (ANE_CIRCUMFERENCE * ANE_FACTOR)
+        while not self._stop.wait(self.tick):
+            t = time.time()
+            wind_speed = max(0.0, self.wind_speed * (1.0 + 0.5 * math.sin(t / 30.0) + 0.3 * math.sin(t * 1.7)))
+            rain = max(0.0, self.rain * math.sin(t / 600.0))
+            with self._lock:
+                self._wind_pulses += wind_speed * pulses_per_meter * self.tick
+                self._rain_ticks += rain / 3600.0 / RAIN_MM_PER_TICK * self.tick
+                wind, self._wind_pulses = divmod(self._wind_pulses, 1.0)
+                rain, self._rain_ticks = divmod(self._rain_ticks, 1.0)
+                self._wind_counter = (self._wind_counter + int(wind)) & 0x7F
+                self._rain_counter = (self._rain_counter + int(rain)) & 0x7F
+            if wind or rain:
+                os.write(self._edge_w, b"\0")
+
+    def enable_interrupts(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._t_counters, daemon=True)
+            self._thread.start()
+
+    def read_bme280(self):
+        self.transactions += 1
+        t = time.time()
+        return 10.0 + math.sin(t / 10.0) * 20.0, 1050.0 + math.sin(t / 10.0) * 50.0, 50.0 + math.sin(t / 10.0) * 25.0
+
+    def read_lux(self):
+        self.transactions += 1
+        return 500.0 + math.sin(time.time()) * 250.0
+
+    def read_vane(self):
+        self.transactions += 1
+        # Now and then the vane swings to a neighbouring compass point
+        if random.random() < 0.2:
+            voltages = sorted(wind_direction_to_degrees, key=wind_direction_to_degrees.get)
+            index = voltages.index(self._vane) + random.choice((-1, 1))
+            self._vane = voltages[index % len(voltages)]
+        return self._vane
+
+    def read_switch_counters(self):
+        self.transactions += 1
+        with self._lock:
+            return self._wind_counter, self._rain_counter
+
+    def clear_switch_counters(self):
+        self.transactions += 2
+        with self._lock:
+            self._wind_counter = 0
+            self._rain_counter = 0
+
+    @property
+    def interrupt_fd(self):
+        return self._edge_r
+
+    def read_interrupts(self):
+        try:
+            return len(os.read(self._edge_r, 4096))
+        except BlockingIOError:
+            return 0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._edge_r)
+        os.close(self._edge_w)